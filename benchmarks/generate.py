@@ -0,0 +1,201 @@
+"""
+Synthetic no-intro style ROM library generator for benchmarks.
+
+Usage: python benchmarks/generate.py [folder] [--files N] [--sizes profile] [--layout layout] [--seed N]
+Without a folder, the library is created in a temporary folder (in tmpfs, if available) and its path is printed.
+"""
+
+import os
+import sys
+import random
+import tempfile
+
+# Probabilities of the different kinds of releases, tuned to look like a typical cartridge-era no-intro set
+distributions = {
+    # Number of releases per game, weights for 1, 2, 3... releases
+    "releases": [50, 22, 12, 7, 4, 3, 2],
+    "regions": {
+        "USA": 30, "Europe": 22, "Japan": 25, "World": 5, "USA, Europe": 6, "Japan, USA": 3, "Japan, Europe": 2,
+        "Germany": 2, "France": 1, "Spain": 1, "Brazil": 1, "Korea": 1, "Asia": 1, "China": 1, "Australia": 1,
+    },
+    "languages": 0.15,
+    "revision": 0.12,
+    "version": 0.05,
+    "beta": 0.07,
+    "proto_date": 0.03,
+    "virtual_console": 0.03,
+    "video": 0.03,
+    "alt": 0.03,
+    "homebrew": 0.03,
+    "pirate": 0.02,
+    "bios": 0.002,
+    # Part of the games that are multi-disc sets (only for the 'disc' size profile)
+    "multi_disc": 0.2,
+}
+
+# (min, max) file sizes and extensions of the size profiles
+size_profiles = {
+    "empty": ((0, 0), (".nes", ".sfc", ".md", ".gba")),
+    "tiny": ((64, 4 * 1024), (".nes", ".sfc", ".md", ".gba")),
+    "cart": ((128 * 1024, 4 * 1024 * 1024), (".nes", ".sfc", ".md", ".gba")),
+    "disc": ((32 * 1024 * 1024, 128 * 1024 * 1024), (".iso", ".chd")),
+}
+
+layouts = ("flat", "nested", "sorted")
+
+words = [
+    "Super", "Mega", "Ultra", "Hyper", "Final", "Legend", "Quest", "Dragon", "Knight", "Shadow", "Star", "Space",
+    "Battle", "Power", "Street", "Racing", "Soccer", "Tennis", "Golf", "Ninja", "Robot", "Castle", "Dungeon",
+    "Island", "Ocean", "Thunder", "Fire", "Ice", "Crystal", "Magic", "Sword", "Warrior", "Hunter", "Pilot",
+    "Tank", "Rally", "Puzzle", "Blaster", "Fighter", "Runner", "Galaxy", "Planet", "Jungle", "Desert", "City",
+    "Tower", "Kingdom", "Empire", "Ghost", "Monster", "Hero", "Adventure", "Mystery", "Secret", "Lost",
+    "Golden", "Silver", "Iron", "Wild", "Turbo",
+]
+sequels = ["", " 2", " 3", " II", " III", " Deluxe", " Special", " Returns", " Gaiden", " Zero", " Plus", " X"]
+extensions_noise = ["desktop.ini", "Thumbs.db", ".DS_Store"]
+
+def get_title(index) -> str:
+    """Unique game title for every index, like 'Dragon Castle II' or 'Dragon Castle II 7'."""
+    title_words = []
+    n = index
+    for _ in range(2):
+        title_words.append(words[n % len(words)])
+        n //= len(words)
+    title = " ".join(title_words) + sequels[n % len(sequels)]
+    n //= len(sequels)
+    return title + f" {n + 1}" if n else title
+
+def weighted_choice(rng, weights) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+def make_release_tags(rng, regions) -> list[str]:
+    d = distributions
+    release_tags = [regions]
+    if rng.random() < d["languages"]:
+        release_tags.append(rng.choice(["En,Fr,De", "En,Ja", "En,Fr,Es,It", "Fr,De"]))
+    if rng.random() < d["beta"]:
+        release_tags.append(rng.choice(["Beta", "Beta 1", "Beta 2", "Proto", "Proto 2", "Sample", "Demo"]))
+        if rng.random() < d["proto_date"] / d["beta"]:
+            release_tags.append(f"{rng.randint(1985, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+    elif rng.random() < d["revision"]:
+        release_tags.append(rng.choice(["Rev 1", "Rev 2", "Rev A", "Rev B"]))
+    elif rng.random() < d["version"]:
+        release_tags.append(rng.choice(["v1.1", "v1.2", "v2.0"]))
+    if rng.random() < d["virtual_console"]:
+        release_tags.append("Virtual Console")
+    if rng.random() < d["video"]:
+        release_tags.append(rng.choice(["NTSC", "PAL"]))
+    if rng.random() < d["alt"]:
+        release_tags.append("Alt 1")
+    return release_tags
+
+def make_names(count, seed=0, sizes="cart") -> list[str]:
+    """
+    Generates 'count' unique file names, grouped into games with several releases each,
+    with regions, revisions, betas, discs and homebrew tags distributed as in real sets.
+    """
+    d = distributions
+    rng = random.Random(seed)
+    extensions = size_profiles[sizes][1]
+    names = []
+    seen = set()
+    game = 0
+    while len(names) < count:
+        title = get_title(game)
+        game += 1
+        ext = rng.choice(extensions)
+        special = []
+        if rng.random() < d["homebrew"]:
+            special.append(rng.choice(["Homebrew", "Aftermarket"]))
+        elif rng.random() < d["pirate"]:
+            special.append(rng.choice(["Pirate", "Unl"]))
+        prefix = "[BIOS] " if rng.random() < d["bios"] else ""
+        discs = rng.randint(2, 4) if sizes == "disc" and rng.random() < d["multi_disc"] else 0
+
+        releases = rng.choices(range(1, len(d["releases"]) + 1), weights=d["releases"])[0]
+        for _ in range(releases):
+            release_tags = make_release_tags(rng, weighted_choice(rng, d["regions"])) + special
+            for disc in range(1, discs + 1) if discs else [None]:
+                disc_tags = release_tags + [f"Disc {disc}"] if disc is not None else release_tags
+                name = prefix + title + "".join(f" ({t})" for t in disc_tags) + ext
+                if name not in seen:
+                    seen.add(name)
+                    names.append(name)
+    return names[:count]
+
+def get_folder(rng, name, layout) -> str:
+    if layout == "flat":
+        return ""
+    if layout == "sorted":
+        first = name[0].upper()
+        return first if first.isalpha() else "1-9"
+    return os.path.join("", *rng.sample(["Sub", "More", "Deeper", "Other"], rng.randint(0, 2)))
+
+class DataPool:
+    """Random data to slice files from, so big libraries are written fast and still don't compress to nothing."""
+
+    def __init__(self, rng, size=16 * 1024 * 1024):
+        self.data = rng.randbytes(size) if hasattr(rng, "randbytes") else os.urandom(size)
+        self.rng = rng
+
+    def write(self, f, size):
+        while size > 0:
+            chunk = min(size, 1024 * 1024)
+            offset = self.rng.randrange(len(self.data) - chunk + 1)
+            f.write(self.data[offset:offset + chunk])
+            size -= chunk
+
+def create_library(root=None, count=1000, sizes="cart", layout="nested", seed=0, meta_files=True) -> str:
+    """
+    Creates a synthetic library of 'count' files in the 'root' folder. If 'root' is None, a new temporary
+    folder is created, in tmpfs if the system has one. Returns the library folder.
+    """
+    if root is None:
+        tmpfs = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+        root = tempfile.mkdtemp(prefix="romlm-bench-", dir=tmpfs)
+    rng = random.Random(seed)
+    (min_size, max_size), _ = size_profiles[sizes]
+    pool = DataPool(rng) if max_size > 0 else None
+    created = set()
+
+    for name in make_names(count, seed, sizes):
+        folder = os.path.join(root, get_folder(rng, name, layout))
+        if folder not in created:
+            os.makedirs(folder, exist_ok=True)
+            created.add(folder)
+            if meta_files and rng.random() < 0.1:
+                with open(os.path.join(folder, rng.choice(extensions_noise)), "wb") as f:
+                    f.write(b"meta")
+        with open(os.path.join(folder, name), "wb") as f:
+            if pool is not None:
+                pool.write(f, rng.randint(min_size, max_size))
+    return root
+
+def main():
+    args = sys.argv[1:]
+    options = {"--files": "1000", "--sizes": "cart", "--layout": "nested", "--seed": "0"}
+    root = None
+    i = 0
+    while i < len(args):
+        if args[i] in options and i + 1 < len(args):
+            options[args[i]] = args[i + 1]
+            i += 2
+        elif args[i] == "--no-meta":
+            options["--no-meta"] = True
+            i += 1
+        elif not args[i].startswith("-") and root is None:
+            root = args[i]
+            i += 1
+        else:
+            print(f"Unknown argument '{args[i]}'")
+            sys.exit(1)
+    if options["--sizes"] not in size_profiles or options["--layout"] not in layouts:
+        print(f"Sizes can be one of {', '.join(size_profiles)}, layout one of {', '.join(layouts)}")
+        sys.exit(1)
+
+    root = create_library(root, int(options["--files"]), options["--sizes"], options["--layout"],
+                          int(options["--seed"]), "--no-meta" not in options)
+    print(root)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Benchmark runner. Every benchmark runs in a fresh process, to measure its own peak memory,
+on a synthetic library from generate.py, and reports ops/sec, wall time and peak RSS.
+
+Usage: python benchmarks/run.py [--files N] [--sizes profile] [--only parse,dedupe,...] [--repeat N]
+                                [--jobs N] [--executor process|thread|auto] [--format 7z|zip]
+                                [--output results.json] [--compare old.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+benchmarks_folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(benchmarks_folder), "src"))
+sys.path.insert(0, benchmarks_folder)
+
+import generate
+import scanner
+
+benchmarks = ("parse", "score", "dedupe", "route", "sort", "pack", "extract")
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def get_peak_rss_mb(who) -> float:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_romlm(args):
+    """Runs romlm in this process, as from the command line, with all the output muted."""
+    import romlm
+    sys.argv = ["romlm"] + args
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        try:
+            romlm.mane()
+        except SystemExit as e:
+            if e.code:
+                raise RuntimeError(f"romlm {' '.join(args)} failed with code {e.code}")
+
+def bench_parse(options) -> tuple[int, float]:
+    import tags
+    names = generate.make_names(options["files"], options["seed"], options["sizes"])
+    tags.parse.cache_clear()
+    start = time.perf_counter()
+    for name in names:
+        tags.parse(name)
+    return len(names), time.perf_counter() - start
+
+def bench_score(options) -> tuple[int, float]:
+    import tags
+    import duplicates
+    names = generate.make_names(options["files"], options["seed"], options["sizes"])
+    candidates = [(name, tags.parse(name).is_beta) for name in names]
+    start = time.perf_counter()
+    duplicates.score_files(candidates, False)
+    return len(names), time.perf_counter() - start
+
+def bench_dedupe(options) -> tuple[int, float]:
+    import tags
+    import duplicates
+    names = generate.make_names(options["files"], options["seed"], options["sizes"])
+    tags.parse.cache_clear()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        start = time.perf_counter()
+        duplicates.plan_duplicates(names, duplicates.Action.KEEP_ALL, False, False)
+        elapsed = time.perf_counter() - start
+    return len(names), elapsed
+
+def bench_route(options) -> tuple[int, float]:
+    import tags
+    import rules
+    from romlm import CategoryOption, get_new_folder
+    names = generate.make_names(options["files"], options["seed"], options["sizes"])
+    # Dozens of folders, like routing by every region, language and collection
+    folder_tags = sorted({t for name in names[:10000] for t in tags.parse(name).tags})[:60]
+    folder_rules = rules.FolderRules.from_folders(folder_tags, ["beta"])
+    for name in names:
+        tags.parse(name)
+    start = time.perf_counter()
+    for name in names:
+        get_new_folder(name, CategoryOption.HOMEBREW | CategoryOption.PIRATES, CategoryOption(0), folder_rules)
+    return len(names), time.perf_counter() - start
+
+def bench_library(args):
+    def bench(options) -> tuple[int, float]:
+        count = sum(1 for _, _, files in os.walk(options["library"]) for f in files if scanner.is_rom_file_name(f))
+        start = time.perf_counter()
+        run_romlm(["-i", options["library"], "-j", str(options["jobs"]), "--executor", options["executor"]]
+                  + args(options))
+        return count, time.perf_counter() - start
+    return bench
+
+bench_functions = {
+    "parse": bench_parse,
+    "score": bench_score,
+    "dedupe": bench_dedupe,
+    "route": bench_route,
+    "sort": bench_library(lambda options: ["-s", "a"]),
+    "pack": bench_library(lambda options: ["-p", options["format"]]),
+    "extract": bench_library(lambda options: ["-x"]),
+}
+
+def run_child(name, options):
+    """Entry of a benchmark process, prints its result as JSON."""
+    ops, wall = bench_functions[name](options)
+    result = {
+        "ops": ops,
+        "wall_s": round(wall, 4),
+        "ops_per_sec": round(ops / wall, 1) if wall > 0 else None,
+        "peak_rss_mb": get_peak_rss_mb("self"),
+        "workers_peak_rss_mb": get_peak_rss_mb("children"),
+    }
+    print(json.dumps(result))
+
+def run_benchmark(name, options) -> dict:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, json.dumps(options)],
+                            check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def prepare_library(name, options, libraries) -> str:
+    """Generates a library for the benchmarks working with files. 'extract' reuses the packed 'pack' one."""
+    if name == "extract" and libraries.get("pack") is not None:
+        return libraries["pack"]
+    if name in libraries:
+        shutil.rmtree(libraries[name], ignore_errors=True)
+    # Moving files doesn't depend on their size, so the sorting library has empty files
+    sizes = "empty" if name == "sort" else options["sizes"]
+    libraries[name] = generate.create_library(None, options["files"], sizes, "nested", options["seed"])
+    if name == "extract":
+        run_romlm(["-i", libraries[name], "-p", options["format"]])
+    return libraries[name]
+
+def run_all(options, selected, repeat) -> dict:
+    results = {}
+    libraries = {}
+    try:
+        for name in selected:
+            best = None
+            for _ in range(repeat):
+                if name in ("sort", "pack", "extract"):
+                    options["library"] = prepare_library(name, options, libraries)
+                result = run_benchmark(name, options)
+                if best is None or result["wall_s"] < best["wall_s"]:
+                    best = result
+                # Only the first extraction has archives to extract, pack them again for the next round
+                if name == "extract" and "pack" in libraries:
+                    libraries["extract"] = libraries.pop("pack")
+            results[name] = best
+            print(f"{name:<8} {best['ops']:>9} ops {best['wall_s']:>10.3f}s {best['ops_per_sec'] or 0:>12.0f} ops/s "
+                  f"{best['peak_rss_mb'] or 0:>8.1f} MB (workers {best['workers_peak_rss_mb'] or 0:.1f} MB)")
+    finally:
+        for library in libraries.values():
+            shutil.rmtree(library, ignore_errors=True)
+    return results
+
+def compare(old, new):
+    print(f"\nCompared to romlm v{old['romlm']} ({old['date']}):")
+    for name, result in new["results"].items():
+        previous = old["results"].get(name)
+        if previous is None or not previous.get("ops_per_sec") or not result.get("ops_per_sec"):
+            continue
+        ratio = result["ops_per_sec"] / previous["ops_per_sec"]
+        print(f"{name:<8} {previous['ops_per_sec']:>12.0f} -> {result['ops_per_sec']:>12.0f} ops/s ({ratio:.2f}x)")
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == "--child":
+        run_child(args[1], json.loads(args[2]))
+        return
+
+    import romlm
+    options = {"files": 1000, "sizes": "tiny", "seed": 0, "jobs": os.cpu_count() or 1, "executor": "auto",
+               "format": "7z"}
+    selected = list(benchmarks)
+    repeat = 1
+    output_file = None
+    compare_file = None
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = args[i + 1] if i + 1 < len(args) else None
+        if value is None:
+            print(f"Argument '{arg}' requires a value")
+            sys.exit(1)
+        if arg in ("--files", "--seed", "--jobs"):
+            options[arg[2:]] = int(value)
+        elif arg == "--sizes" and value in generate.size_profiles:
+            options["sizes"] = value
+        elif arg == "--executor" and value in ("process", "thread", "auto"):
+            options["executor"] = value
+        elif arg == "--format" and value in ("7z", "zip"):
+            options["format"] = value
+        elif arg == "--only" and all(b in benchmarks for b in value.split(",")):
+            selected = [b for b in benchmarks if b in value.split(",")]
+        elif arg == "--repeat":
+            repeat = max(1, int(value))
+        elif arg == "--output":
+            output_file = value
+        elif arg == "--compare":
+            compare_file = value
+        else:
+            print(f"Unknown argument or value: {arg} {value}")
+            sys.exit(1)
+        i += 2
+
+    print(f"romlm v{romlm.version}, {options['files']} files, '{options['sizes']}' sizes, {options['jobs']} jobs")
+    results = {
+        "romlm": romlm.version,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": options,
+        "results": run_all(dict(options), selected, repeat),
+    }
+
+    if output_file is not None:
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {output_file}")
+    if compare_file is not None:
+        with open(compare_file, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Startup regression check. Measures the import time of romlm and 'romlm -v', and checks that heavy modules
+are not imported by the runs that don't need them. Exits with an error code if any check fails.
+
+Usage: python benchmarks/startup.py [--budget-ms N] [--repeat N] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+
+benchmarks_folder = os.path.dirname(os.path.abspath(__file__))
+src_folder = os.path.join(os.path.dirname(benchmarks_folder), "src")
+sys.path.insert(0, benchmarks_folder)
+
+import generate
+
+# Modules that only some operations need, and should never be loaded at startup
+heavy_modules = ["py7zr", "zipfile", "sqlite3", "xml.etree.ElementTree", "multiprocessing.pool",
+                 "concurrent.futures.process", "cProfile", "archives", "index", "dat", "hashes"]
+
+# (name, romlm arguments or None for a bare import, modules that must not be imported)
+checks = [
+    ("import", None, heavy_modules),
+    ("version", ["-v"], heavy_modules),
+    ("sort", ["-s", "a"], heavy_modules),
+    ("remove duplicates", ["-r", "all"], heavy_modules),
+    ("pack zip", ["-p", "zip", "-j", "2"], ["py7zr", "sqlite3", "xml.etree.ElementTree"]),
+]
+
+def run_python(args, cwd=None) -> tuple[float, set, float]:
+    """Runs python with -X importtime. Returns wall seconds, imported modules and romlm import seconds."""
+    env = dict(os.environ, PYTHONPATH=src_folder)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=cwd, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"python {' '.join(args)} failed:\n{process.stderr}")
+    modules = set()
+    romlm_import = None
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        modules.add(name)
+        if name == "romlm" and cumulative.strip().isdigit():
+            romlm_import = int(cumulative) / 1000000
+    return wall, modules, romlm_import
+
+def main():
+    args = sys.argv[1:]
+    budget_ms = 150
+    repeat = 5
+    output_file = None
+    for i in range(0, len(args), 2):
+        if args[i] == "--budget-ms":
+            budget_ms = int(args[i + 1])
+        elif args[i] == "--repeat":
+            repeat = int(args[i + 1])
+        elif args[i] == "--output":
+            output_file = args[i + 1]
+        else:
+            print(f"Unknown argument '{args[i]}'")
+            sys.exit(1)
+
+    failures = []
+    results = {"budget_ms": budget_ms}
+    romlm_script = os.path.join(src_folder, "romlm.py")
+
+    # Best of several runs, to not depend on a cold disk cache
+    import_times = [run_python(["-c", "import romlm"])[2] for _ in range(repeat)]
+    version_times = [run_python([romlm_script, "-v"])[0] for _ in range(repeat)]
+    results["import_ms"] = round(min(import_times) * 1000, 1)
+    results["version_ms"] = round(min(version_times) * 1000, 1)
+    print(f"import romlm: {results['import_ms']} ms, romlm -v: {results['version_ms']} ms (budget {budget_ms} ms)")
+    if results["import_ms"] > budget_ms:
+        failures.append(f"import romlm takes {results['import_ms']} ms, more than {budget_ms} ms")
+
+    for name, romlm_args, forbidden in checks:
+        library = None
+        try:
+            if romlm_args is None:
+                _, modules, _ = run_python(["-c", "import romlm"])
+            else:
+                library = generate.create_library(None, 50, "tiny", "nested")
+                _, modules, _ = run_python([romlm_script, "-i", library] + romlm_args)
+        finally:
+            if library is not None:
+                shutil.rmtree(library, ignore_errors=True)
+        loaded = sorted(m for m in forbidden if m in modules)
+        results[name] = loaded
+        print(f"{name:<20} {'OK' if not loaded else 'imports ' + ', '.join(loaded)}")
+        if loaded:
+            failures.append(f"'{name}' imports {', '.join(loaded)}")
+
+    if output_file is not None:
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(dict(results, failures=failures), f, indent=2)
+    if failures:
+        print("FAILED:\n" + "\n".join(failures))
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+
+# py7zr pulls in a whole compression and crypto stack, so it's imported only when a 7z archive is processed
+copy_buffer_size = 1024 * 1024
+# 7z members are repacked in memory in batches up to that uncompressed size, bigger ones are staged on disk one by one
+repack_memory_limit = 256 * 1024 * 1024
+# Temporary files and folders are hidden, so they are never picked up by the scanner
+temp_prefix = ".romlm-"
+# Temporary files become the outputs, so they are created with the usual permissions of new files (under the umask),
+# not private like mkstemp() ones
+temp_file_flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+
+zip_local_header = struct.Struct("<4s2B4HL2L2H")
+
+class VerificationError(Exception):
+    pass
+
+class SizedReader(io.BufferedIOBase):
+    """
+    Read-only stream of a known size, over a non-seekable one (like an archive member).
+    Allows only the seeks py7zr does to get the size of a stream, so members can be written without buffering.
+    """
+
+    def __init__(self, raw, size):
+        self.raw = raw
+        self.size = size
+        self.position = 0
+        self.reported = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size=-1) -> bytes:
+        if self.reported is not None:
+            raise io.UnsupportedOperation("read after seek")
+        data = self.raw.read(size)
+        self.position += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self.reported if self.reported is not None else self.position
+
+    def seek(self, offset, whence=io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.tell(), io.SEEK_END: self.size}[whence]
+        target = base + offset
+        self.reported = None if target == self.position else target
+        return target
+
+def get_archive_format(path) -> str:
+    return "7z" if path.endswith(".7z") else "zip" if path.endswith(".zip") else None
+
+def list_members(path, archive_format=None) -> list[tuple[str, str, int]]:
+    """Returns (name, crc32 hex, size) for every file in the 7z/zip archive, read from its headers only."""
+    archive_format = archive_format or get_archive_format(path)
+    if archive_format == "zip":
+        with zipfile.ZipFile(path, "r") as archive:
+            return [(info.filename, f"{info.CRC:08x}", info.file_size) for info in archive.infolist() if not info.is_dir()]
+    import py7zr
+    with py7zr.SevenZipFile(path, "r") as archive:
+        return [(info.filename, f"{info.crc32 or 0:08x}", info.uncompressed)
+                for info in archive.list() if not info.is_directory]
+
+def get_member_path(target_folder, name) -> str:
+    """Safe path for an archive member inside the target folder, like zipfile does it for extractall."""
+    name = name.replace("\\", "/")
+    parts = [p for p in name.split("/") if p not in ("", ".", "..")]
+    if parts:
+        parts[0] = os.path.splitdrive(parts[0])[1] or parts[0]
+    return os.path.join(target_folder, *parts)
+
+def make_temp_file(path) -> tuple[int, str]:
+    folder = os.path.dirname(path) or "."
+    while True:
+        temp_path = os.path.join(folder, f"{temp_prefix}{os.urandom(6).hex()}.tmp")
+        try:
+            return os.open(temp_path, temp_file_flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+def get_file_crc(path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(copy_buffer_size):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+# Copy a range of one file into another, in the kernel when it's possible
+def copy_range(src_fd, dst_fd, offset, count):
+    copied = 0
+    try:
+        while copied < count:
+            n = os.copy_file_range(src_fd, dst_fd, count - copied, offset + copied)
+            if n == 0:
+                break
+            copied += n
+        return
+    except (AttributeError, OSError):
+        pass
+    try:
+        while copied < count:
+            n = os.sendfile(dst_fd, src_fd, offset + copied, count - copied)
+            if n == 0:
+                break
+            copied += n
+        return
+    except (AttributeError, OSError):
+        pass
+    # No pread() on Windows, the source is seeked there, and then put back where it was,
+    # as it's the descriptor of a buffered file, which expects its position unchanged
+    pread = getattr(os, "pread", None)
+    position = None
+    if pread is None:
+        position = os.lseek(src_fd, 0, os.SEEK_CUR)
+        os.lseek(src_fd, offset + copied, os.SEEK_SET)
+    try:
+        while copied < count:
+            size = min(copy_buffer_size, count - copied)
+            chunk = pread(src_fd, size, offset + copied) if pread is not None else os.read(src_fd, size)
+            if not chunk:
+                break
+            os.write(dst_fd, chunk)
+            copied += len(chunk)
+    finally:
+        if position is not None:
+            os.lseek(src_fd, position, os.SEEK_SET)
+
+def get_zip_data_offset(fp, info) -> int:
+    fp.seek(info.header_offset)
+    header = zip_local_header.unpack(fp.read(zip_local_header.size))
+    name_length, extra_length = header[-2], header[-1]
+    return info.header_offset + zip_local_header.size + name_length + extra_length
+
+def extract_zip_member(archive, raw_file, info, temp_fd, temp_path):
+    if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+        # Stored member is just a range of the archive, copy it without Python reads and verify afterwards
+        try:
+            copy_range(raw_file.fileno(), temp_fd, get_zip_data_offset(raw_file, info), info.file_size)
+        finally:
+            os.close(temp_fd)
+        if os.path.getsize(temp_path) != info.file_size or get_file_crc(temp_path) != info.CRC:
+            raise VerificationError(f"Bad CRC or size of '{info.filename}'")
+    else:
+        # ZipExtFile checks the CRC by itself when the member is read to the end
+        with archive.open(info) as src, os.fdopen(temp_fd, "wb") as dst:
+            shutil.copyfileobj(src, dst, copy_buffer_size)
+
+def extract_zip(file_name, target_folder) -> list[tuple[str, str]]:
+    """Extracts all members to temporary files next to their targets. Returns a list of (temp_path, target_path)."""
+    extracted = []
+    try:
+        with open(file_name, "rb") as raw_file, zipfile.ZipFile(file_name, "r") as archive:
+            for info in archive.infolist():
+                target_path = get_member_path(target_folder, info.filename)
+                if info.is_dir():
+                    os.makedirs(target_path, exist_ok=True)
+                    continue
+                os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+                temp_fd, temp_path = make_temp_file(target_path)
+                extracted.append((temp_path, target_path))
+                extract_zip_member(archive, raw_file, info, temp_fd, temp_path)
+    except BaseException:
+        for temp_path, _ in extracted:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+    return extracted
+
+def extract_7z(file_name, target_folder) -> tuple[str, list[tuple[str, str]]]:
+    """
+    Extracts all members to a temporary folder inside the target folder. py7zr checks CRCs while writing.
+    Returns the temporary folder and a list of (temp_path, target_path).
+    """
+    import py7zr
+    temp_folder = tempfile.mkdtemp(prefix=temp_prefix, dir=target_folder or ".")
+    try:
+        with py7zr.SevenZipFile(file_name, "r") as archive:
+            sizes = {info.filename: info.uncompressed for info in archive.list() if not info.is_directory}
+            archive.extractall(temp_folder)
+        extracted = []
+        for name, size in sizes.items():
+            temp_path = get_member_path(temp_folder, name)
+            if os.path.getsize(temp_path) != size:
+                raise VerificationError(f"Bad size of '{name}'")
+            extracted.append((temp_path, get_member_path(target_folder, name)))
+    except BaseException:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        raise
+    return temp_folder, extracted
+
+def extract(file_name, target_folder) -> list[str]:
+    """
+    Extracts a 7z/zip archive into the target folder. Every member is written to a temporary file first,
+    and only when all of them are written and verified they are atomically moved in place.
+    Returns the list of extracted files. The archive itself is not removed here.
+    """
+    temp_folder = None
+    if file_name.endswith(".7z"):
+        temp_folder, extracted = extract_7z(file_name, target_folder)
+    else:
+        extracted = extract_zip(file_name, target_folder)
+    for temp_path, target_path in extracted:
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        os.replace(temp_path, target_path)
+    if temp_folder is not None:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+    return [target_path for _, target_path in extracted]
+
+def pack(file_name, target_folder, packing_format) -> str:
+    """
+    Packs a single file into a 7z/zip archive in the target folder. The archive is written to a temporary file
+    and moved in place only when complete, so an interrupted run never leaves a truncated archive.
+    Returns the archive path. The file is not removed here.
+    """
+    archive_path = os.path.join(target_folder, os.path.basename(file_name)) + "." + packing_format
+    temp_fd, temp_path = make_temp_file(archive_path)
+    os.close(temp_fd)
+    try:
+        if packing_format == "7z":
+            import py7zr
+            with py7zr.SevenZipFile(temp_path, "w") as archive:
+                archive.write(file_name, arcname=os.path.basename(file_name))
+        elif packing_format == "zip":
+            with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.write(file_name, arcname=os.path.basename(file_name))
+        os.replace(temp_path, archive_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return archive_path
+
+def pack_solid(file_names, archive_path) -> str:
+    """
+    Packs files into one solid 7z archive, so similar files (like releases of the same game) are compressed together.
+    Members of an already existing archive are kept, files with the same names replace them. The archive is written
+    to a temporary file and moved in place only when complete. Returns the archive path. Files are not removed here.
+    """
+    import py7zr
+    temp_folder = None
+    members = {}
+    temp_fd, temp_path = make_temp_file(archive_path)
+    os.close(temp_fd)
+    try:
+        if os.path.exists(archive_path):
+            temp_folder, extracted = extract_7z(archive_path, os.path.dirname(archive_path))
+            members = {os.path.relpath(member_path, temp_folder): member_path for member_path, _ in extracted}
+        members.update((os.path.basename(f), f) for f in file_names)
+        with py7zr.SevenZipFile(temp_path, "w") as archive:
+            # Sorted, so the closest releases are next to each other in the solid block
+            for name, path in sorted(members.items()):
+                archive.write(path, arcname=name)
+        os.replace(temp_path, archive_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        if temp_folder is not None:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+    return archive_path
+
+def remove_temp_files(folder) -> int:
+    """Removes temporary files and folders left in the folder by an interrupted run. Returns their number."""
+    removed = 0
+    try:
+        with os.scandir(folder or ".") as it:
+            entries = [e for e in it if e.name.startswith(temp_prefix)]
+    except OSError:
+        return 0
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            os.remove(entry.path)
+        removed += 1
+    return removed
+
+def get_repacked_path(file_name, target_folder, packing_format) -> str:
+    return os.path.join(target_folder, os.path.splitext(os.path.basename(file_name))[0] + "." + packing_format)
+
+def repack_zip_to_7z(file_name, output_path):
+    import py7zr
+    with zipfile.ZipFile(file_name, "r") as archive, py7zr.SevenZipFile(output_path, "w") as output:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            with archive.open(info) as member:
+                output.writef(SizedReader(member, info.file_size), info.filename)
+
+def get_repack_batches(members) -> list[list]:
+    """Splits 7z members into batches read at once, small ones up to the memory limit, every big one alone."""
+    batches = []
+    batch_size = 0
+    for info in members:
+        is_big = info.uncompressed > repack_memory_limit
+        if is_big or not batches or batch_size + info.uncompressed > repack_memory_limit:
+            batches.append([])
+            batch_size = 0
+        batches[-1].append(info)
+        batch_size += info.uncompressed
+    return batches
+
+def repack_7z_to_zip(file_name, output_path):
+    import py7zr
+    with py7zr.SevenZipFile(file_name, "r") as archive, \
+            zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as output:
+        members = [info for info in archive.list() if not info.is_directory]
+        for batch in get_repack_batches(members):
+            names = [info.filename for info in batch]
+            if batch[0].uncompressed <= repack_memory_limit:
+                for name, data in archive.read(targets=names).items():
+                    with output.open(name, "w") as dst:
+                        shutil.copyfileobj(data, dst, copy_buffer_size)
+            else:
+                # py7zr can't stream members out, so a huge one goes through a staging folder on the same filesystem
+                staging_folder = tempfile.mkdtemp(prefix=temp_prefix, dir=os.path.dirname(output_path) or ".")
+                try:
+                    archive.extract(staging_folder, targets=names)
+                    output.write(get_member_path(staging_folder, names[0]), arcname=names[0])
+                finally:
+                    shutil.rmtree(staging_folder, ignore_errors=True)
+            # Every read goes through the archive from its start
+            archive.reset()
+
+def repack(file_name, target_folder, packing_format) -> str:
+    """
+    Converts a 7z/zip archive to the other format, streaming members from one archive to another.
+    The new archive is written to a temporary file, checked against the source CRCs and sizes,
+    and only then moved in place. Returns the new archive path. The source is not removed here.
+    Raises FileExistsError if the new archive path is taken.
+    """
+    new_path = get_repacked_path(file_name, target_folder, packing_format)
+    # Another archive of the same game is never replaced
+    if os.path.exists(new_path):
+        raise FileExistsError(f"'{new_path}' already exists")
+    temp_fd, temp_path = make_temp_file(new_path)
+    os.close(temp_fd)
+    try:
+        if packing_format == "7z":
+            repack_zip_to_7z(file_name, temp_path)
+        else:
+            repack_7z_to_zip(file_name, temp_path)
+        if sorted(list_members(temp_path, packing_format)) != sorted(list_members(file_name)):
+            raise VerificationError(f"Repacked archive doesn't match '{file_name}'")
+        if os.path.exists(new_path):
+            raise FileExistsError(f"'{new_path}' already exists")
+        os.replace(temp_path, new_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return new_path
@@ -0,0 +1,93 @@
+import os
+import xml.etree.ElementTree as ElementTree
+from enum import Enum
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+
+import hashes
+import archives
+
+verify_workers = 16
+
+class Status(Enum):
+    HAVE = "have"
+    BAD_NAME = "badname"
+    # Library file, which is not in the DAT
+    UNKNOWN = "unknown"
+    # ROM of the DAT, which is not in the library
+    MISS = "miss"
+
+class VerifyResult(NamedTuple):
+    path: str
+    member: str
+    status: Status
+    expected: str = None
+
+class Dat:
+    """
+    ROMs of a Logiqx XML DAT (no-intro, redump, etc.), indexed by (crc32, size).
+    ROMs found by check() are remembered, so the ones the library lacks are known after all files are checked.
+    """
+
+    def __init__(self, path):
+        self.name = None
+        self.roms = {}
+        self.found = set()
+        # Stream the file, clearing every game after it's read, so even huge DATs take no memory
+        for _, elem in ElementTree.iterparse(path, events=("end",)):
+            if elem.tag == "rom":
+                crc = elem.get("crc")
+                size = elem.get("size")
+                if crc is not None and size is not None:
+                    self.roms.setdefault((crc.lower(), int(size)), []).append(elem.get("name"))
+            elif elem.tag == "name" and self.name is None:
+                self.name = elem.text
+            elif elem.tag in ("game", "machine"):
+                elem.clear()
+
+    def check(self, path, member, crc, size) -> VerifyResult:
+        names = self.roms.get((crc, size))
+        if names is None:
+            return VerifyResult(path, member, Status.UNKNOWN)
+        self.found.add((crc, size))
+        if os.path.basename(member) in names:
+            return VerifyResult(path, member, Status.HAVE, member)
+        return VerifyResult(path, member, Status.BAD_NAME, names[0])
+
+    def missing(self) -> list[VerifyResult]:
+        """ROMs of the DAT, which were not found by check(), their 'path' is the name in the DAT."""
+        return [VerifyResult(name, os.path.basename(name), Status.MISS)
+                for key, names in self.roms.items() if key not in self.found for name in names]
+
+def get_members(path, cache=None, file_entry=None) -> list[tuple[str, str, int]]:
+    """
+    Returns (name, crc32, size) for every file in the archive, read from the archive headers only,
+    or for the file itself, if it's not an archive.
+    """
+    if archives.get_archive_format(path) is not None:
+        return archives.list_members(path)
+    size = file_entry.size if file_entry is not None else os.path.getsize(path)
+    cached = cache.get(file_entry) if cache is not None and file_entry is not None else None
+    if cached is not None and cached[1] is not None:
+        crc = cached[1]
+    else:
+        crc, sha1 = hashes.get_full_hashes(path, size)
+        if cache is not None and file_entry is not None:
+            cache.put(file_entry, crc=crc, sha1=sha1)
+    return [(os.path.basename(path), crc, size)]
+
+def verify(dat, file_entries, cache=None, workers=None):
+    """
+    Checks the list of scanner.FileEntry against the DAT in parallel, yielding a list of VerifyResult per file.
+    ROMs of the DAT, which are not in the library, are given by dat.missing() afterwards.
+    Archives are checked by their headers only, loose files are hashed (and cached in the 'cache', if specified).
+    """
+    def verify_file(file_entry) -> list[VerifyResult]:
+        try:
+            members = get_members(file_entry.path, cache, file_entry)
+        except Exception as e:
+            return [VerifyResult(file_entry.path, os.path.basename(file_entry.path), Status.UNKNOWN, str(e))]
+        return [dat.check(file_entry.path, name, crc, size) for name, crc, size in members]
+
+    with ThreadPoolExecutor(max_workers=workers or verify_workers, thread_name_prefix="romlm-verify") as executor:
+        yield from executor.map(verify_file, file_entries)
@@ -1,10 +1,15 @@
 import os
-import re
+import json
+import hashlib
 from enum import Enum
+from typing import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from colorama import Fore, Style
 
 import tags
+import rules
+import events
 
 class Action(Enum):
     NOT_DEFINED = 0
@@ -12,152 +17,182 @@ class Action(Enum):
     KEEP_ALL = 2
     KEEP_ONE = 3
 
-top_region_priority = "world"
-region_priority = ["usa", "europe"]
-asian_regions = ["japan", "asia", "china", "korea"]
+# Version of the scoring rules, to be bumped when they change, so decisions made by the old ones are not replayed
+rules_version = 1
+# Hidden, so it's never picked up by the scanner
+decisions_file_name = ".romlm.decisions"
 
-# Is ROM a part of multi-disc set?
-def get_disc_number(tags_list) -> int:
+# Below that number of files to score, a process pool costs more than it saves
+parallel_scoring_threshold = 50000
+# Concurrent deletions, mostly to hide the latency of network storages
+removal_workers = 16
+
+class PlanEntry(NamedTuple):
+    path: str
+    is_kept: bool
+    reason: str
+    score: Optional[tuple] = None
+
+class RemovalPlan:
     """
-    Returns '-1' if the ROM is not a part of a multi-disc set, or disc number otherwise.
+    Decisions of the duplicates removal: which files are kept and which are removed, and why.
+    Nothing is touched on disk until the plan is executed.
     """
-    for t in tags_list:
-        m = re.match(r"(disc|disk|track)\s*(\d+)", t)
-        if m:
-            return int(m.group(2))
-    return -1
-
-# Helper: parse date like (1993-07-09)
-def parse_date_yyyy_mm_dd(tag: str) -> bool:
+
+    def __init__(self):
+        self.entries = []
+
+    def keep(self, path, reason, score=None):
+        self.entries.append(PlanEntry(path, True, reason, score))
+
+    def remove(self, path, reason, score=None):
+        self.entries.append(PlanEntry(path, False, reason, score))
+
+    @property
+    def kept(self) -> list:
+        return [e.path for e in self.entries if e.is_kept]
+
+    @property
+    def removed(self) -> list:
+        return [e.path for e in self.entries if not e.is_kept]
+
+    def print(self):
+        for e in self.entries:
+            if not e.is_kept:
+                print(f"Would remove: {Fore.RED}{e.path}{Style.RESET_ALL} ({e.reason})")
+        print(f"Would keep {Fore.GREEN}{len(self.kept)}{Style.RESET_ALL} "
+              f"and remove {Fore.RED}{len(self.removed)}{Style.RESET_ALL} files.")
+
+    def export(self, path):
+        def to_dict(e):
+            return {"path": e.path, "reason": e.reason, "score": list(e.score) if e.score is not None else None}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "kept": [to_dict(e) for e in self.entries if e.is_kept],
+                "removed": [to_dict(e) for e in self.entries if not e.is_kept],
+            }, f, indent=2)
+
+def get_rules_signature() -> str:
+    return json.dumps([rules_version, rules.active.signature])
+
+class DecisionCache:
     """
-    Return True if tag looks like YYYY-MM-DD, else False.
-    We won't parse the integer, we just treat "has date" as a boolean.
+    Outcomes of the duplicates removal of every game group, in a sidecar file at the library root.
+    Groups that didn't change since the previous run are not scored again, and choices made in the 'ask' mode
+    are replayed without asking. A group is identified by the file names of its ROMs (so sorted files still match)
+    and the action, decisions of other scoring rules are dropped on load.
     """
-    return bool(re.match(r"^\d{4}-\d{2}-\d{2}$", tag))
+
+    def __init__(self, root, is_new=False):
+        self.path = os.path.join(root, decisions_file_name)
+        self.groups = {}
+        self.used = set()
+        # Names of all files of the groups in this run, even the ones that were not looked up
+        self.names = set()
+        if is_new or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("rules") == get_rules_signature():
+                self.groups = data["groups"]
+        except (OSError, ValueError, KeyError):
+            # A broken cache is just rebuilt
+            self.groups = {}
+
+    @staticmethod
+    def get_signature(action, paths) -> Optional[str]:
+        names = sorted(os.path.basename(p) for p in paths)
+        # Same names in different folders can't be told apart
+        if len(set(names)) != len(names):
+            return None
+        return hashlib.sha1("\n".join([action.name] + names).encode("utf-8")).hexdigest()
+
+    def get(self, action, paths) -> Optional[list]:
+        """The plan entries of the group, if it was resolved before with the same action."""
+        signature = self.get_signature(action, paths)
+        decision = self.groups.get(signature)
+        if decision is None:
+            return None
+        self.used.add(signature)
+        by_name = {os.path.basename(p): p for p in paths}
+        return [PlanEntry(by_name[f], is_kept, reason) for f, (is_kept, reason) in decision.items()]
+
+    def seen(self, paths):
+        """
+        Remember the files of a group, which is not looked up (like a single file left after the removal),
+        so the decisions it was made by are kept for when the removed releases appear again.
+        """
+        self.names.update(os.path.basename(p) for p in paths)
+
+    def record(self, action, entries):
+        """Remember the plan entries of a group."""
+        signature = self.get_signature(action, [e.path for e in entries])
+        if signature is None:
+            return
+        self.groups[signature] = {os.path.basename(e.path): [e.is_kept, e.reason] for e in entries}
+        self.used.add(signature)
+        # After the removal only the kept files are left, it's the same decision to keep all of them
+        kept = [e for e in entries if e.is_kept]
+        if 1 < len(kept) < len(entries):
+            signature = self.get_signature(action, [e.path for e in kept])
+            self.groups[signature] = {os.path.basename(e.path): [True, e.reason] for e in kept}
+            self.used.add(signature)
+
+    def save(self, is_pruning=True):
+        """
+        Writes the cache atomically. With 'is_pruning' only the groups used in this run are kept,
+        and the ones with a kept file still in the library.
+        """
+        if is_pruning:
+            groups = {k: v for k, v in self.groups.items()
+                      if k in self.used or any(is_kept and f in self.names for f, (is_kept, _) in v.items())}
+        else:
+            groups = self.groups
+        # Created under the umask, like any new file, mkstemp() ones are private
+        flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+        while True:
+            temp_path = os.path.join(os.path.dirname(self.path), f".romlm-{os.urandom(6).hex()}.tmp")
+            try:
+                temp_fd = os.open(temp_path, flags, 0o666)
+                break
+            except FileExistsError:
+                continue
+        try:
+            with os.fdopen(temp_fd, "w", encoding="utf-8") as f:
+                json.dump({"rules": get_rules_signature(), "groups": groups}, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+# Apply the plan, removing files with a bounded pool of threads
+def execute_plan(plan, workers=None) -> int:
+    removed = plan.removed
+    if removed:
+        with ThreadPoolExecutor(max_workers=min(workers or removal_workers, len(removed))) as executor:
+            for _ in executor.map(os.remove, removed):
+                pass
+    return len(removed)
 
 # Identify if file is Beta/Proto/Sample
 def is_beta_file(fpath):
-    tags_list = tags.get_from_filename(os.path.basename(fpath))
-    for t in tags_list:
-        # If it starts with "beta", "proto", or "sample", we treat it as Beta/Proto
-        if (t.startswith("beta")
-                or t.startswith("alpha")
-                or t.startswith("proto")
-                or t.startswith("sample")
-                or t.startswith("demo")):
-            return True
-    return False
-
-# Region coverage + min region index
-def get_region_coverage_and_min_index(tags_list):
-    """
-    Returns (coverage, min_index) where:
-      coverage = number of recognized region tags
-      min_index = the lowest index among recognized tags (or len(region_priority) if none)
-    Example: if tags_list has ["usa", "europe"], coverage=2, min_index=1 ("usa")
-    """
-    # Check if it's a top region priority
-    for t in tags_list:
-        if t == top_region_priority:
-            return len(region_priority), 0
-    # Check if it's a recognized prioritized region
-    recognized = [r for r in tags_list if r in region_priority]
-    coverage = len(recognized)
-    if coverage == 0:
-        return 0, len(region_priority)
-    # find the lowest region index among them
-    min_i = min(region_priority.index(r) for r in recognized)
-    return coverage, min_i
-
-# Is ROM from an Asian region?
-def is_asian_region_and_not_en(tags_list):
-    """
-    Returns True if the ROM is from an Asian region and not in English.
-    """
-    is_asian = False
-    is_en = False
-    for t in tags_list:
-        if t in asian_regions:
-            is_asian = True
-        elif t == "en":
-            is_en = True
-    return is_asian and not is_en
-
-# Count how many unknown tags ROM have (excluding rev, beta/proto, sample, known region)
-def count_unknown_tags(tags_list):
-    count = 0
-    for t in tags_list:
-        # Skip known regions tags
-        if t == top_region_priority:
-            continue
-        if t in region_priority:
-            continue
-        if t in asian_regions:
-            continue
-        # Revisions and versions tags
-        if t.startswith("rev ") or re.match(r"^\d+(?:\.\d+){0,3}$", t):
-            continue
-        # Beta and other in-development tags
-        if t.startswith("beta") or t.startswith("alpha") or t.startswith("proto") or t.startswith("sample"):
-            continue
-        # Language tags
-        if t in ["en", "fr", "de", "es", "it", "nl", "pt", "sv", "no", "da", "fi"]:
-            continue
-        # anything else is "extra"
-        count += 1
-    return count
-
-# Get video format score for comparison (NTSC > none > PAL)
-def get_video_format_score(tags_list) -> int:
-    """
-    Convert a video format tag into a single integer for comparison.
-    """
-    if "ntsc" in tags_list:
-        return 2
-    if "pal" in tags_list:
-        return 0
-    return 1
-
-# Try to get version from tags list
-def try_get_version_score(tags_list) -> tuple[int, bool]:
-    for t in tags_list:
-        # Catch numeric revisions
-        m = re.match(r"^(rev|proto|alpha|beta|sample|demo)\s+([a-z])$", t)
-        if m:
-            rev = m.group(2)[0]
-            rev_score = ord(rev) - ord('a') + 1
-            return rev_score, True
-        # Catch version numbers
-        m = re.match(r"^(?:(rev|beta|alpha|proto|sample|demo)\s+)?v?(\d+(?:\.\d+){0,3})?$", t)
-        if m:
-            version_str = m.group(2)
-            parts = version_str.split(".")
-            version_tuple = tuple(map(int, parts)) + (0,) * (4 - len(parts))
-            version_score = int("".join(f"{v:03}" for v in version_tuple))
-            return version_score, True
-    return 0, False
-
-# Get the date score from tags list
-def get_date_score(tags_list) -> int:
-    for t in tags_list:
-        if parse_date_yyyy_mm_dd(t):
-            date_score = int(t.replace("-", ""))
-            return date_score
-    return 0
+    return tags.parse(os.path.basename(fpath)).is_beta
 
 # Normal-file scoring: ( -region_coverage, min_region_index, non_region_tags, -video_format, -revision, -date )
-def score_normal_file(fpath, is_debug_log):
-    tags_list = tags.get_from_filename(os.path.basename(fpath))
+def score_normal_file(fpath, is_debug_log, tag_rules=None):
+    rom = tags.parse(os.path.basename(fpath))
+    tags_list = rom.tags
 
-    coverage, min_idx = get_region_coverage_and_min_index(tags_list)
-    video_format_score = get_video_format_score(tags_list)
-    non_region = count_unknown_tags(tags_list)
-    date_score = get_date_score(tags_list)
+    # Region coverage and the best region index, other tags count, Asian region and video format (NTSC > none > PAL)
+    coverage, min_idx, non_region, is_asian, video_format_score = (tag_rules or rules.active).get_features(tags_list)
+    date_score = rom.date
 
-    version_score, version_found = try_get_version_score(tags_list)
+    version_score, version_found = rom.version, rom.has_version
 
     # Set a slight tags penalty for Asian regions to prioritize english versions even it's new (from Virtual Consoles, etc.)
-    if is_asian_region_and_not_en(tags_list):
+    if is_asian:
         non_region += 2
 
     # For Homebrew, assume that no explicit revision version is 1.0.0.0 (initial release)
@@ -181,14 +216,13 @@ def score_normal_file(fpath, is_debug_log):
     )
 
 # Beta/Proto scoring: ( -latest_date, -region_coverage, -beta_number, non_region_tags )
-def score_beta_file(fpath, is_debug_log):
-    tags_list = tags.get_from_filename(os.path.basename(fpath))
+def score_beta_file(fpath, is_debug_log, tag_rules=None):
+    rom = tags.parse(os.path.basename(fpath))
 
-    coverage, _ = get_region_coverage_and_min_index(tags_list)
-    best_date_score = get_date_score(tags_list)
-    non_region = count_unknown_tags(tags_list)
+    coverage, _, non_region, _, _ = (tag_rules or rules.active).get_features(rom.tags)
+    best_date_score = rom.date
 
-    version_score, _ = try_get_version_score(tags_list)
+    version_score = rom.version
 
     if is_debug_log:
         print(f"  >>> {fpath} (BETA): {Fore.MAGENTA}date({best_date_score}), reg({coverage}), v({version_score}), "
@@ -201,25 +235,68 @@ def score_beta_file(fpath, is_debug_log):
         non_region
     )
 
-# Print list of files in a color
-def print_files_list(files_list, color):
-    for file_name in files_list:
-        print(f" - {color}{os.path.basename(file_name)}{Style.RESET_ALL}")
-
 # Left only one file in the set
-def keep_one(files_set, selected, is_log_enabled, number) -> set:
-    if is_log_enabled:
-        print(f"{number}Removing duplicate(s):")
-    for file_name in files_set:
-        if file_name != selected:
-            if is_log_enabled:
-                print(f"- {Fore.RED}{os.path.basename(file_name)}{Style.RESET_ALL}")
-            os.remove(file_name)
-    if is_log_enabled:
-        print(f"| >> Keeping one: {Fore.GREEN}{os.path.basename(selected)}{Style.RESET_ALL}")
+def keep_one(files_set, selected, group, plan, reason, scores) -> set:
+    removed = [file_name for file_name in files_set if file_name != selected]
+    for file_name in removed:
+        plan.remove(file_name, reason, scores.get(file_name))
+    events.emit("dedupe.keep_one", **group, path=selected, removed=removed, reason=reason,
+                scores={f: scores.get(f) for f in files_set})
     return {selected}
 
-def clean_duplicates(file_list, action, is_log_enabled, is_debug_log):
+# Score a chunk of candidates: [(path, is_beta)] => [score]
+def score_files(candidates, is_debug_log, tag_rules=None) -> list:
+    tag_rules = tag_rules or rules.active
+    return [score_beta_file(p, is_debug_log, tag_rules) if beta else score_normal_file(p, is_debug_log, tag_rules)
+            for p, beta in candidates]
+
+def _score_chunk(args) -> list:
+    return score_files(*args)
+
+# Score all the candidates in one batch pass, fanning out to a process pool for the big sets
+def score_candidates(candidates, is_debug_log) -> list:
+    workers = os.cpu_count() or 1
+    # Debug prints from the workers would be interleaved, so keep them in one process
+    if len(candidates) < parallel_scoring_threshold or workers == 1 or is_debug_log:
+        return score_files(candidates, is_debug_log)
+    chunk_size = -(-len(candidates) // (workers * 4))
+    # Rules go with every chunk, as workers may be spawned without the ones loaded by the main process
+    chunks = [(candidates[i:i + chunk_size], is_debug_log, rules.active)
+              for i in range(0, len(candidates), chunk_size)]
+    # Imported here, as it loads multiprocessing, which most of the runs don't need
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [score for scores in executor.map(_score_chunk, chunks) for score in scores]
+
+# Pick the best files of every group with one sort by (group, score, position)
+def resolve_best(groups, is_debug_log) -> dict:
+    """
+    'groups' is a list of (group_index, candidates, is_beta). Returns ({group_index: [best files]}, {path: score}).
+    For the releases all equally scored files are the best ones, for the betas only the first one is.
+    """
+    candidates = []
+    owners = []
+    for g, paths, beta in groups:
+        for position, p in enumerate(paths):
+            candidates.append((p, beta))
+            owners.append((g, position))
+    scores = score_candidates(candidates, is_debug_log)
+
+    order = sorted(range(len(candidates)), key=lambda k: (owners[k][0], scores[k], owners[k][1]))
+    best = {}
+    best_score = {}
+    for k in order:
+        g = owners[k][0]
+        path, beta = candidates[k]
+        if g not in best:
+            best[g] = [path]
+            best_score[g] = scores[k]
+        elif not beta and scores[k] == best_score[g]:
+            best[g].append(path)
+    return best, {path: score for (path, _), score in zip(candidates, scores)}
+
+def plan_duplicates(file_list, action, is_log_enabled, is_debug_log, resolved=None, is_summary=True,
+                    decisions=None) -> RemovalPlan:
     """
     For each distinct base name (game):
       1) Partition into normal vs beta/proto.
@@ -235,49 +312,55 @@ def clean_duplicates(file_list, action, is_log_enabled, is_debug_log):
          - Higher numeric suffix is better
          - Fewer non-region tags
       4) Remove the rest. Never remove all for a given game; if end up with none, keep them all.
+    'resolved' is an optional {path: group} of files that already survived the same process before,
+    groups consisting of such files only are kept as is.
+    'is_summary' prints the totals first, it's off for small batches, like the ones of --watch.
+    'decisions' is an optional DecisionCache, the groups found there are replayed and all others are recorded.
+    Only makes a RemovalPlan, nothing is removed here.
     """
 
-    # Get a log iteration string formatted as "(N/M)"
-    def n(index) -> str:
-        return f"({index}/{len(groups_iter)}) "
+    # Group position for the log events, rendered as "(N/M)"
+    def n(index) -> dict:
+        return {"group": index, "groups": len(by_basename)}
 
     # Group files by base name
     file_list = list(file_list)
     by_basename = {}
+    resolved = resolved or {}
 
     for f in file_list:
-        fname = os.path.basename(f)
-        base = tags.get_base_name(fname)
-        disc = get_disc_number(tags.get_from_filename(fname))
-        if disc > -1:
-            base += f" (Disc {disc})"
-        by_basename.setdefault(base, []).append(f)
-
-    print(
-        ">> Removing duplicates safely... \nTotal ROMs:",
-        len(file_list),
-        "\nActual games:",
-        len(by_basename),
-    )
-
-    files_to_keep = set()
-
-    # MAIN LOOP of removing duplicates
-    groups_iter = by_basename.items() if is_log_enabled \
-        else tqdm(by_basename.items(), desc="Cleaning Duplicates", total=len(by_basename))
-
-    i = 0
-    for base, paths in groups_iter:
-        i += 1
-
-        # Only one file => trivially keep it
-        if len(paths) == 1:
-            files_to_keep.add(paths[0])
-            if is_log_enabled:
-                print(f"{n(i)}Single ROM: {Fore.GREEN}{os.path.basename(paths[0])}{Style.RESET_ALL}")
+        group = resolved.get(f)
+        if group is None:
+            group = tags.parse(os.path.basename(f)).group
+        # Solid archives of whole games are never duplicates of their own releases
+        if f.endswith(".7z") and tags.parse(os.path.basename(f)).is_game_archive:
+            group = f
+        by_basename.setdefault(group, []).append(f)
+
+    if is_summary:
+        print(
+            ">> Removing duplicates safely... \nTotal ROMs:",
+            len(file_list),
+            "\nActual games:",
+            len(by_basename),
+        )
+
+    # Partition every group into normal vs. beta/proto, and collect the ones which need scoring
+    partitions = []
+    to_score = []
+    replayed = {}
+    for i, paths in enumerate(by_basename.values(), start=1):
+        if len(paths) == 1 or all(p in resolved for p in paths):
+            if decisions is not None:
+                decisions.seen(paths)
+            partitions.append(None)
             continue
-
-        # Partition into normal vs. beta/proto
+        if decisions is not None:
+            entries = decisions.get(action, paths)
+            if entries is not None:
+                replayed[i] = entries
+                partitions.append(None)
+                continue
         normal_files = []
         beta_proto_files = []
         for p in paths:
@@ -285,137 +368,154 @@ def clean_duplicates(file_list, action, is_log_enabled, is_debug_log):
                 beta_proto_files.append(p)
             else:
                 normal_files.append(p)
+        partitions.append((normal_files, beta_proto_files))
+        if len(normal_files) > 1:
+            to_score.append((i, normal_files, False))
+        elif not normal_files and len(beta_proto_files) > 1:
+            to_score.append((i, beta_proto_files, True))
+
+    best_by_group, scores = resolve_best(to_score, is_debug_log)
+
+    plan = RemovalPlan()
+
+    # MAIN LOOP of removing duplicates
+    groups_iter = enumerate(zip(by_basename.items(), partitions), start=1)
+    if not is_log_enabled:
+        groups_iter = tqdm(groups_iter, desc="Cleaning Duplicates", total=len(by_basename))
+
+    for i, ((base, paths), partition) in groups_iter:
+        # Only one file => trivially keep it
+        if len(paths) == 1:
+            plan.keep(paths[0], "single ROM")
+            events.emit("dedupe.single", **n(i), path=paths[0])
+            continue
+
+        # The same group was resolved before, the decision is replayed
+        if i in replayed:
+            plan.entries.extend(replayed[i])
+            events.emit("dedupe.replayed", **n(i), base=base, kept=[e.path for e in replayed[i] if e.is_kept],
+                        removed=[e.path for e in replayed[i] if not e.is_kept])
+            continue
 
+        # Nothing changed in the group since the last time
+        if partition is None:
+            for p in paths:
+                plan.keep(p, "already resolved")
+            events.emit("dedupe.resolved", **n(i), base=base, paths=paths)
+            continue
+
+        normal_files, beta_proto_files = partition
         if normal_files:
             # Remove all Beta/Proto
             chosen_set = normal_files
-            if is_log_enabled and beta_proto_files:
-                print(f"{n(i)}Removing all Betas: ")
-                print_files_list(beta_proto_files, Fore.RED)
-                print(f" | >> Has {len(normal_files)} release(s):")
-                print_files_list(normal_files, Fore.GREEN)
             for bp in beta_proto_files:
-                os.remove(bp)
+                plan.remove(bp, "beta of a released game")
+            if beta_proto_files:
+                events.emit("dedupe.betas", **n(i), removed=beta_proto_files, kept=normal_files,
+                            reason="beta of a released game")
         else:
             # No normal => only Beta/Proto
             # Pick exactly one best-scored
             if len(beta_proto_files) == 1:
-                files_to_keep.add(beta_proto_files[0])
-                if is_log_enabled:
-                    print(f"{n(i)}Single Beta: {Fore.GREEN}{os.path.basename(beta_proto_files[0])}{Style.RESET_ALL}")
+                plan.keep(beta_proto_files[0], "single beta")
+                events.emit("dedupe.single_beta", **n(i), path=beta_proto_files[0])
                 continue
 
-            best_bp = None
-            best_score = None
-            for bp in beta_proto_files:
-                sc = score_beta_file(bp, is_debug_log)
-                if (best_score is None) or (sc < best_score):
-                    best_score = sc
-                    best_bp = bp
-
-            keep_set = {best_bp}
+            best_bp = best_by_group[i][0]
             for bp in beta_proto_files:
                 if bp != best_bp:
-                    if is_log_enabled:
-                        print(f"{n(i)}Removing earlier Beta: {Fore.RED}{os.path.basename(bp)}{Style.RESET_ALL}")
-                    os.remove(bp)
-
-            # safety check: never remove all
-            if not keep_set:
-                # fallback => keep them all
-                for p in beta_proto_files:
-                    files_to_keep.add(p)
-                if is_log_enabled:
-                    print(f"{n(i)}No latest Beta, keeping all:")
-                    print_files_list(beta_proto_files, Fore.GREEN)
-            else:
-                for f in keep_set:
-                    files_to_keep.add(f)
-                if is_log_enabled:
-                    print(f"{n(i)}Latest Beta: {Fore.GREEN}{os.path.basename(best_bp)}{Style.RESET_ALL}")
-            continue
+                    events.emit("dedupe.remove", **n(i), path=bp, reason="earlier beta", score=scores[bp])
+                    plan.remove(bp, "earlier beta", scores[bp])
 
-        # If chosen_set is empty for some reason, fallback => keep them all
-        if not chosen_set:
-            for p in paths:
-                files_to_keep.add(p)
-            if is_log_enabled:
-                print(f"{n(i)}No release ROMs, keeping all these:")
-                print_files_list(paths, Fore.GREEN)
+            plan.keep(best_bp, "latest beta", scores[best_bp])
+            events.emit("dedupe.latest_beta", **n(i), path=best_bp, score=scores[best_bp])
             continue
 
         # Among the chosen normal set, pick best scored files
         if len(chosen_set) == 1:
-            files_to_keep.add(chosen_set[0])
-            if is_log_enabled:
-                print(f"{n(i)}Single release ROM: {Fore.GREEN}{os.path.basename(chosen_set[0])}{Style.RESET_ALL}")
+            plan.keep(chosen_set[0], "single release")
+            events.emit("dedupe.single_release", **n(i), path=chosen_set[0])
             continue
 
-        best_normal = set()
-        best_score = None
-        for nf in chosen_set:
-            sc = score_normal_file(nf, is_debug_log)
-            if (best_score is None) or (sc < best_score):
-                best_score = sc
-                best_normal = {nf}
-            elif sc == best_score:
-                best_normal.add(nf)
-
         # remove all others
-        keep_set = best_normal
+        keep_set = set(best_by_group[i])
         for nf in chosen_set:
-            if nf not in best_normal:
-                if is_log_enabled:
-                    print(f"{n(i)}Removing duplicate: {Fore.RED}{os.path.basename(nf)}{Style.RESET_ALL}")
-                os.remove(nf)
-
-        # safety check
-        if not keep_set:
-            # fallback => keep them all
-            for f in chosen_set:
-                files_to_keep.add(f)
-            if is_log_enabled:
-                print(f"{n(i)}No best ROM, keeping all:")
-                print_files_list(chosen_set, Fore.GREEN)
-        else:
-            # check what we need to do with the rest of the best
-            if len(keep_set) > 1:
-                if action == Action.KEEP_ALL:
-                    if is_log_enabled:
-                        print(f"{n(i)}Keeping all best ROMs:")
-                        print_files_list(keep_set, Fore.GREEN)
-
-                elif action == Action.KEEP_ONE:
-                    best_kept = min(keep_set, key=lambda x: x)
-                    keep_set = keep_one(keep_set, best_kept, is_log_enabled, n(i))
-
-                elif action == Action.ASK:
-                    print(f"{n(i)}Can't decide which one is the best. Please select one to keep:")
-                    keep_list = list(keep_set)
-                    for idx, file in enumerate(keep_list, start=1):
-                        print(f" {idx}. {Fore.YELLOW}{os.path.basename(file)}{Style.RESET_ALL}")
-
-                    selected_index = -1
-                    while selected_index < 0 or selected_index > len(keep_list):
-                        try:
-                            selected_index = int(input("Enter the number of the file to keep (0 to keep all): "))
-                        except ValueError:
-                            print("Invalid input. Please enter a number.")
-
-                    if selected_index == 0:
-                        if is_log_enabled:
-                            print(f"{n(i)}Keeping all best ROMs:")
-                            print_files_list(keep_set, Fore.GREEN)
-                    else:
-                        user_selected = keep_list[selected_index - 1]
-                        keep_set = keep_one(keep_set, user_selected, is_log_enabled, n(i))
-
-            if len(keep_set) == 1:
-                if is_log_enabled:
-                    print(f"{n(i)}Best ROM: {Fore.GREEN}{os.path.basename(next(iter(keep_set)))}{Style.RESET_ALL}")
-
-            for f in keep_set:
-                files_to_keep.add(f)
-
-    # Return only files we decided to keep
-    return [f for f in file_list if f in files_to_keep]
\ No newline at end of file
+            if nf not in keep_set:
+                events.emit("dedupe.remove", **n(i), path=nf, reason="worse score", score=scores[nf])
+                plan.remove(nf, "worse score", scores[nf])
+
+        # check what we need to do with the rest of the best
+        if len(keep_set) > 1:
+            if action == Action.KEEP_ALL:
+                events.emit("dedupe.keep_all", **n(i), paths=list(keep_set), scores={f: scores[f] for f in keep_set})
+
+            elif action == Action.KEEP_ONE:
+                best_kept = min(keep_set, key=lambda x: x)
+                keep_set = keep_one(keep_set, best_kept, n(i), plan, "equal score, keep one", scores)
+
+            elif action == Action.ASK:
+                print(f"({i}/{len(by_basename)}) Can't decide which one is the best. Please select one to keep:")
+                keep_list = best_by_group[i]
+                for idx, file in enumerate(keep_list, start=1):
+                    print(f" {idx}. {Fore.YELLOW}{os.path.basename(file)}{Style.RESET_ALL}")
+
+                selected_index = -1
+                while selected_index < 0 or selected_index > len(keep_list):
+                    try:
+                        selected_index = int(input("Enter the number of the file to keep (0 to keep all): "))
+                    except ValueError:
+                        print("Invalid input. Please enter a number.")
+
+                if selected_index == 0:
+                    events.emit("dedupe.keep_all", **n(i), paths=list(keep_set),
+                                scores={f: scores[f] for f in keep_set})
+                else:
+                    user_selected = keep_list[selected_index - 1]
+                    keep_set = keep_one(keep_set, user_selected, n(i), plan, "not selected", scores)
+
+        if len(keep_set) == 1:
+            best = next(iter(keep_set))
+            events.emit("dedupe.best", **n(i), path=best, score=scores[best])
+
+        for f in best_by_group[i]:
+            if f in keep_set:
+                plan.keep(f, "best score", scores[f])
+
+    if decisions is not None:
+        outcomes = {e.path: e for e in plan.entries}
+        for paths, partition in zip(by_basename.values(), partitions):
+            if partition is not None:
+                decisions.record(action, [outcomes[p] for p in paths])
+
+    return plan
+
+def plan_content_duplicates(identical_groups) -> RemovalPlan:
+    """
+    For every group of files with identical content keep exactly one, the best by its name:
+    releases over betas, then by the usual score, then by path.
+    """
+    def rank(path):
+        if is_beta_file(path):
+            return True, score_beta_file(path, False), path
+        return False, score_normal_file(path, False), path
+
+    plan = RemovalPlan()
+    for paths in identical_groups:
+        ranks = {p: rank(p) for p in paths}
+        best = min(paths, key=ranks.get)
+        removed = [p for p in paths if p != best]
+        plan.keep(best, "best name of identical files", ranks[best][1])
+        for p in removed:
+            plan.remove(p, f"identical to '{best}'", ranks[p][1])
+        events.emit("dedupe.identical", path=best, removed=removed, scores={p: ranks[p][1] for p in paths})
+    return plan
+
+def clean_duplicates(file_list, action, is_log_enabled, is_debug_log, resolved=None, decisions=None) -> list:
+    """
+    Plan the duplicates removal (see plan_duplicates) and execute it. Returns the list of kept files.
+    """
+    file_list = list(file_list)
+    plan = plan_duplicates(file_list, action, is_log_enabled, is_debug_log, resolved, decisions=decisions)
+    execute_plan(plan)
+    files_to_keep = set(plan.kept)
+    return [f for f in file_list if f in files_to_keep]
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from colorama import Fore, Style
+
+# Records waiting for the writer thread, emit() blocks only when the writer is that far behind
+queue_size = 16384
+write_buffer_size = 1024 * 1024
+
+log_formats = ("text", "jsonl")
+
+class Palette:
+    def __init__(self, is_colored):
+        self.green = Fore.GREEN if is_colored else ""
+        self.red = Fore.RED if is_colored else ""
+        self.blue = Fore.BLUE if is_colored else ""
+        self.yellow = Fore.YELLOW if is_colored else ""
+        self.reset = Style.RESET_ALL if is_colored else ""
+
+colored = Palette(True)
+plain = Palette(False)
+
+def n(r) -> str:
+    return f"({r['group']}/{r['groups']}) "
+
+def name(path) -> str:
+    return os.path.basename(path)
+
+def files_list(paths, color, c, prefix=" - ") -> str:
+    return "".join(f"\n{prefix}{color}{name(p)}{c.reset}" for p in paths)
+
+status_colors = {"have": "green", "badname": "yellow", "unknown": "blue", "miss": "red"}
+process_results = {"extract": "Unpacked to", "repack": "Repacked to", "pack": "Packed to"}
+removal_reasons = {"earlier beta": "Removing earlier Beta", "worse score": "Removing duplicate"}
+
+# Human-readable form of every event, 'c' is a Palette
+renderers = {
+    "dedupe.single": lambda r, c: f"{n(r)}Single ROM: {c.green}{name(r['path'])}{c.reset}",
+    "dedupe.resolved": lambda r, c: f"{n(r)}Already resolved: {c.green}{r['base']}{c.reset}",
+    "dedupe.replayed": lambda r, c: f"{n(r)}Decided before: {c.green}{r['base']}{c.reset}"
+                                    + files_list(r["removed"], c.red, c, " - removing: "),
+    "dedupe.betas": lambda r, c: f"{n(r)}Removing all Betas: {files_list(r['removed'], c.red, c)}\n"
+                                 f" | >> Has {len(r['kept'])} release(s):{files_list(r['kept'], c.green, c)}",
+    "dedupe.single_beta": lambda r, c: f"{n(r)}Single Beta: {c.green}{name(r['path'])}{c.reset}",
+    "dedupe.latest_beta": lambda r, c: f"{n(r)}Latest Beta: {c.green}{name(r['path'])}{c.reset}",
+    "dedupe.single_release": lambda r, c: f"{n(r)}Single release ROM: {c.green}{name(r['path'])}{c.reset}",
+    "dedupe.remove": lambda r, c: f"{n(r)}{removal_reasons[r['reason']]}: {c.red}{name(r['path'])}{c.reset}",
+    "dedupe.keep_all": lambda r, c: f"{n(r)}Keeping all best ROMs:{files_list(r['paths'], c.green, c)}",
+    "dedupe.keep_one": lambda r, c: f"{n(r)}Removing duplicate(s):{files_list(r['removed'], c.red, c, '- ')}\n"
+                                    f"| >> Keeping one: {c.green}{name(r['path'])}{c.reset}",
+    "dedupe.best": lambda r, c: f"{n(r)}Best ROM: {c.green}{name(r['path'])}{c.reset}",
+    "dedupe.identical": lambda r, c: f"Identical content: {c.green}{r['path']}{c.reset}"
+                                     + "".join(f"\n - {c.red}{p}{c.reset}" for p in r["removed"]),
+    "verify": lambda r, c: f"{getattr(c, status_colors[r['status']])}{r['status']}{c.reset}: {r['path']}"
+                           + (f" :: {r['member']}" if r["member"] != name(r["path"]) else "")
+                           + (f" (expected '{r['expected']}')" if r["status"] == "badname" else ""),
+    "move": lambda r, c: f" >> Moved to: {c.blue}{os.path.dirname(r['target'])}{c.reset}",
+    "process": lambda r, c: f"({r['index']}/{r['total']}) Processed: {c.green}{r['path']}{c.reset}"
+                            + (f"\n >> {process_results[r['action']]}: {c.blue}{r['output']}{c.reset}"
+                               if r["action"] is not None else ""),
+    "meta_removed": lambda r, c: f"Removed meta file: {c.red}{r['path']}{c.reset}",
+    "folder_removed": lambda r, c: f"Removed empty folder: {c.red}{r['path']}{c.reset}",
+}
+
+def render(record, palette=colored) -> str:
+    return renderers[record["event"]](record, palette)
+
+def to_json(record) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+class LogWriter:
+    """
+    Writes records to a file from a background thread. The queue is bounded, so memory stays flat
+    if the disk can't keep up, and records are formatted and written in big chunks by the thread.
+    """
+
+    def __init__(self, path, formatter):
+        self.file = open(path, "w", encoding="utf-8", buffering=write_buffer_size)
+        self.formatter = formatter
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, name="romlm-log", daemon=True)
+        self.thread.start()
+
+    def __call__(self, record):
+        self.queue.put(record)
+
+    def run(self):
+        is_closed = False
+        while not is_closed:
+            records = [self.queue.get()]
+            # Take everything queued meanwhile, to write it at once
+            while len(records) < queue_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in records:
+                records = records[:records.index(None)]
+                is_closed = True
+            if records:
+                self.file.write("".join(self.formatter(r) + "\n" for r in records))
+        self.file.close()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+start_time = time.perf_counter()
+sinks = []
+writers = []
+
+def console(record):
+    print(render(record))
+
+def configure(is_console, log_file=None, log_format="text"):
+    """
+    Sets where events go: colored text to the console, if 'is_console', and text or JSON lines
+    to the 'log_file' through a background writer.
+    """
+    sinks.clear()
+    if is_console:
+        sinks.append(console)
+    if log_file is not None:
+        writer = LogWriter(log_file, to_json if log_format == "jsonl" else lambda r: render(r, plain))
+        writers.append(writer)
+        sinks.append(writer)
+        atexit.register(close)
+
+def is_enabled() -> bool:
+    return bool(sinks)
+
+def emit(event, **fields):
+    """Sends an event record to all sinks. Does nothing if there are none."""
+    if not sinks:
+        return
+    record = {"ts": round(time.perf_counter() - start_time, 6), "event": event}
+    record.update(fields)
+    for sink in sinks:
+        sink(record)
+
+def close():
+    """Flushes and closes the log files. Called on exit automatically."""
+    while writers:
+        writer = writers.pop()
+        if writer in sinks:
+            sinks.remove(writer)
+        writer.close()
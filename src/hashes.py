@@ -0,0 +1,75 @@
+import mmap
+import hashlib
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Size of the first and the last blocks, hashed to quickly split files of the same size
+edge_block_size = 64 * 1024
+hash_workers = 8
+
+def get_edges_hash(path, size) -> str:
+    with open(path, "rb") as f:
+        h = hashlib.sha1(f.read(edge_block_size))
+        if size > edge_block_size:
+            f.seek(max(edge_block_size, size - edge_block_size))
+            h.update(f.read(edge_block_size))
+    return h.hexdigest()
+
+def get_full_hashes(path, size) -> tuple[str, str]:
+    """Returns (crc32, sha1) of the whole file, as hex strings."""
+    with open(path, "rb") as f:
+        if size == 0:
+            data = b""
+            return f"{zlib.crc32(data):08x}", hashlib.sha1(data).hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return f"{zlib.crc32(data):08x}", hashlib.sha1(data).hexdigest()
+
+def split_by(groups, get_key, executor) -> list[list]:
+    """Splits every group of file entries by a key, computed in parallel. Keeps only groups of 2 and more."""
+    candidates = [entry for group in groups for entry in group]
+    keys = executor.map(get_key, candidates)
+    result = {}
+    for entry, key in zip(candidates, keys):
+        result.setdefault((entry.size, key), []).append(entry)
+    return [group for group in result.values() if len(group) > 1]
+
+def find_identical(file_entries, cache=None, workers=None) -> list[list[str]]:
+    """
+    Finds byte-identical files in the list of scanner.FileEntry, with the classic staged pipeline:
+    same size => same first and last blocks => same full CRC32 and SHA1.
+    Every next stage reads more, but only for files that are still colliding.
+    'cache' is an optional index.HashCache, to not read unchanged files again.
+    Returns groups of paths with identical content.
+    """
+    by_size = {}
+    for entry in file_entries:
+        if entry.size > 0:
+            by_size.setdefault(entry.size, []).append(entry)
+    groups = [group for group in by_size.values() if len(group) > 1]
+
+    def edges_hash(entry) -> str:
+        cached = cache.get(entry) if cache is not None else None
+        if cached is not None and cached[0] is not None:
+            return cached[0]
+        edges = get_edges_hash(entry.path, entry.size)
+        if cache is not None:
+            cache.put(entry, edges=edges)
+        return edges
+
+    def full_hashes(entry) -> tuple[str, str]:
+        cached = cache.get(entry) if cache is not None else None
+        if cached is not None and cached[1] is not None:
+            return cached[1], cached[2]
+        crc, sha1 = get_full_hashes(entry.path, entry.size)
+        if cache is not None:
+            cache.put(entry, crc=crc, sha1=sha1)
+        return crc, sha1
+
+    with ThreadPoolExecutor(max_workers=workers or hash_workers, thread_name_prefix="romlm-hash") as executor:
+        # Files smaller than two blocks are read whole on the next stage anyway
+        small = [group for group in groups if group[0].size <= 2 * edge_block_size]
+        large = [group for group in groups if group[0].size > 2 * edge_block_size]
+        groups = small + split_by(large, edges_hash, executor)
+        groups = split_by(groups, full_hashes, executor)
+
+    return [sorted(entry.path for entry in group) for group in groups]
@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+
+import tags
+
+index_file_name = ".romlm.db"
+schema_version = 1
+tags_separator = "\x1f"
+
+class IndexEntry:
+    __slots__ = ("size", "mtime", "tags", "group", "action", "dedupe")
+
+    def __init__(self, size, mtime, file_tags, group, action=None, dedupe=None):
+        self.size = size
+        self.mtime = mtime
+        self.tags = file_tags
+        self.group = group
+        self.action = action
+        self.dedupe = dedupe
+
+class LibraryIndex:
+    """
+    On-disk index of the library, stored as an SQLite file at the library root.
+    Every file is keyed by its relative path, size and mtime, so unchanged files can skip the work
+    that was already done for them on the previous run.
+    """
+
+    def __init__(self, root, reindex=False):
+        # Files are looked up from the root, not the current folder, as many roots share one run
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(root, index_file_name)
+        self.entries = {}
+        self.unchanged = set()
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, "
+                                "mtime INTEGER, tags TEXT, grp TEXT, action TEXT, dedupe TEXT)")
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if reindex or row is None or int(row[0]) != schema_version:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(schema_version),))
+            self.connection.commit()
+        for path, size, mtime, file_tags, group, action, dedupe \
+                in self.connection.execute("SELECT path, size, mtime, tags, grp, action, dedupe FROM files"):
+            self.entries[path] = IndexEntry(size, mtime, file_tags, group, action, dedupe)
+
+    def refresh(self, file_entries) -> set:
+        """
+        Sync the index with the scanned scanner.FileEntry list. Returns the set of files that were not changed
+        since the previous run.
+        """
+        fresh = {}
+        for f in file_entries:
+            entry = self.entries.get(f.path)
+            if entry is not None and entry.size == f.size and entry.mtime == f.mtime:
+                self.unchanged.add(f.path)
+                fresh[f.path] = entry
+            else:
+                fresh[f.path] = self._new_entry(f.path, f.size, f.mtime)
+        self.entries = fresh
+        return self.unchanged
+
+    def is_done(self, path, action) -> bool:
+        """Returns True if the file was not changed since it was processed with the same action."""
+        return path in self.unchanged and self.entries[path].action == action
+
+    def resolved_groups(self, dedupe) -> dict:
+        """Returns {path: group} for unchanged files that already survived the same duplicates removal."""
+        return {path: self.entries[path].group for path in self.unchanged if self.entries[path].dedupe == dedupe}
+
+    def mark_deduped(self, kept_files, dedupe):
+        kept_files = set(kept_files)
+        for path in list(self.entries):
+            if path in kept_files:
+                self.entries[path].dedupe = dedupe
+            else:
+                self.forget(path)
+
+    def move(self, old_path, new_path, action):
+        """Record that a file was processed with an action, and now lives at the new path."""
+        entry = self.entries.pop(old_path, None)
+        self.unchanged.discard(old_path)
+        full_path = os.path.join(self.root, new_path)
+        if not os.path.isfile(full_path):
+            return
+        stat = os.stat(full_path)
+        new_entry = self._new_entry(new_path, stat.st_size, stat.st_mtime_ns)
+        new_entry.action = action
+        if entry is not None:
+            new_entry.dedupe = entry.dedupe
+        self.entries[new_path] = new_entry
+
+    def forget(self, path):
+        self.entries.pop(path, None)
+        self.unchanged.discard(path)
+
+    def save(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM files")
+            self.connection.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((path, e.size, e.mtime, e.tags, e.group, e.action, e.dedupe) for path, e in self.entries.items()))
+        self.connection.close()
+
+    @staticmethod
+    def _new_entry(path, size, mtime) -> IndexEntry:
+        rom = tags.parse(os.path.basename(path))
+        return IndexEntry(size, mtime, tags_separator.join(rom.tags), rom.group)
+
+class HashCache:
+    """
+    Content hashes of the library files, stored in the same file as the LibraryIndex,
+    or only in memory, for one run, if the 'root' is None.
+    Hashes stay valid while the file keeps the same path, size and mtime. Thread-safe.
+    """
+
+    def __init__(self, root, reindex=False):
+        self.hashes = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.connection = None
+        if root is None:
+            return
+        self.connection = sqlite3.connect(os.path.join(root, index_file_name))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, "
+                                "mtime INTEGER, edges TEXT, crc TEXT, sha1 TEXT)")
+        if reindex:
+            self.connection.execute("DELETE FROM hashes")
+            self.connection.commit()
+        for path, size, mtime, edges, crc, sha1 \
+                in self.connection.execute("SELECT path, size, mtime, edges, crc, sha1 FROM hashes"):
+            self.hashes[path] = (size, mtime, edges, crc, sha1)
+
+    def get(self, file_entry):
+        """Returns (edges, crc, sha1) for the scanner.FileEntry, any of them can be None, or None if not cached."""
+        cached = self.hashes.get(file_entry.path)
+        if cached is None or cached[0] != file_entry.size or cached[1] != file_entry.mtime:
+            return None
+        return cached[2:]
+
+    def put(self, file_entry, edges=None, crc=None, sha1=None):
+        with self.lock:
+            old = self.get(file_entry) or (None, None, None)
+            self.hashes[file_entry.path] = (file_entry.size, file_entry.mtime,
+                                            edges or old[0], crc or old[1], sha1 or old[2])
+            self.dirty.add(file_entry.path)
+
+    def save(self, existing_paths=None):
+        """Writes new hashes, and forgets files which are not in the 'existing_paths' anymore, if specified."""
+        if self.connection is None:
+            return
+        with self.connection:
+            if existing_paths is not None:
+                existing_paths = set(existing_paths)
+                gone = [(path,) for path in self.hashes if path not in existing_paths]
+                self.connection.executemany("DELETE FROM hashes WHERE path = ?", gone)
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                ((path, *self.hashes[path]) for path in self.dirty))
+        self.connection.close()
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import threading
+from typing import NamedTuple, Optional
+
+# Hidden, so it's never picked up by the scanner, JSON lines
+file_name = ".romlm.journal"
+# Records are written straight to the file, so a crash of romlm never loses them,
+# but they are synced to the disk only that often, to survive a power loss as well
+sync_interval = 1.0
+
+PLANNED = "planned"
+STARTED = "started"
+DONE = "done"
+
+class Journal:
+    """
+    Append-only journal of a pack/extract run: every file is 'planned', then 'started' and 'done' by a worker.
+    Every write is a single append of whole lines, so records of concurrent workers are never mixed,
+    and a torn last line after a crash is just skipped by read().
+    """
+
+    def __init__(self, path, is_new=False):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if is_new else 0)
+        self.fd = os.open(path, flags, 0o644)
+        self.last_sync = time.monotonic()
+
+    def write(self, records):
+        if not records:
+            return
+        os.write(self.fd, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+        if time.monotonic() - self.last_sync >= sync_interval:
+            os.fsync(self.fd)
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        os.fsync(self.fd)
+        os.close(self.fd)
+
+class Replay(NamedTuple):
+    action: str
+    # {path: size} in the planned order
+    planned: dict
+    # {path: last state}
+    states: dict
+    # {path: target folder} of the started files
+    targets: dict
+    is_plan_complete: bool
+
+    def remaining(self) -> list[str]:
+        return [f for f in self.planned if self.states.get(f) != DONE]
+
+    def partial_folders(self) -> set[str]:
+        """Target folders of the files which were started but not done, they may have partial outputs."""
+        return {self.targets[f] for f, state in self.states.items() if state == STARTED}
+
+def read(path) -> Optional[Replay]:
+    """Replays the journal of an interrupted run. Returns None if there is no journal."""
+    if not os.path.isfile(path):
+        return None
+    action = None
+    planned = {}
+    states = {}
+    targets = {}
+    is_plan_complete = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            state = record.get("state")
+            if state == "run":
+                action = record["action"]
+            elif state == "plan_complete":
+                is_plan_complete = True
+            elif state == PLANNED:
+                planned[record["path"]] = record["size"]
+                states.setdefault(record["path"], PLANNED)
+            elif state in (STARTED, DONE):
+                states[record["path"]] = state
+                if state == STARTED:
+                    targets[record["path"]] = record["target"]
+    return Replay(action, planned, states, targets, is_plan_complete)
+
+def remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+# Journals of the roots in the worker process, enabled by attach() from the pool initializer,
+# or from the main process for thread workers
+worker_journals = None
+worker_journals_lock = threading.Lock()
+
+def attach(is_enabled):
+    global worker_journals
+    worker_journals = {} if is_enabled else None
+
+def detach():
+    """Closes the journals opened by the workers, thread workers share them with the main process."""
+    global worker_journals
+    if worker_journals is not None:
+        for root_journal in worker_journals.values():
+            root_journal.close()
+    worker_journals = None
+
+def record(root, state, path, target=None):
+    """
+    Writes a record of the file to the journal of its root, if journals are enabled in the worker.
+    The paths are stored relative to the root, an empty 'target' is the current folder.
+    """
+    if worker_journals is None:
+        return
+    root_journal = worker_journals.get(root)
+    if root_journal is None:
+        with worker_journals_lock:
+            root_journal = worker_journals.get(root)
+            if root_journal is None:
+                root_journal = worker_journals[root] = Journal(os.path.join(root, file_name))
+    entry = {"state": state, "path": os.path.relpath(path, root)}
+    if target is not None:
+        entry["target"] = os.path.relpath(target or ".", root)
+    root_journal.write([entry])
@@ -0,0 +1,191 @@
+import os
+from typing import NamedTuple, Optional
+
+import duplicates
+import rules
+import scanner
+import moves
+import scheduler
+from duplicates import Action
+from romlm import (CategoryOption, get_new_folder, process_batch, process_solid_batch, make_solid_groups,
+                   remove_meta_files, remove_empty_folders)
+
+class Move(NamedTuple):
+    path: str
+    new_path: str
+
+class Processed(NamedTuple):
+    path: str
+    action: Optional[str]
+    output: Optional[str]
+    seconds: float
+
+def get_folder_rules(folder_rules, subfolders, exclude_tags) -> Optional[rules.FolderRules]:
+    if subfolders is None and (folder_rules is None or exclude_tags is None):
+        return folder_rules
+    return (folder_rules or rules.FolderRules([])).extended(subfolders, exclude_tags)
+
+class RomLibrary:
+    """
+    A ROMs library at the 'root' folder, to be used from Python code instead of the command line.
+    Works with explicit paths, never changes the current folder, and yields the results of every operation
+    as they come, with paths relative to the 'root'. The scanned files are kept between the calls,
+    so a long-running service doesn't rescan the library for every operation.
+    Packing and extracting go through the 'executor' (any concurrent.futures.Executor), so pools can be
+    shared between libraries. Without it, a process pool is created on the first use and kept until close().
+    """
+
+    def __init__(self, root, executor=None, jobs=None):
+        self.root = os.path.abspath(root)
+        self.executor = executor
+        self.jobs = jobs or os.cpu_count() or 1
+        self.is_own_executor = False
+        self.entries = None
+        self.meta_files = []
+        self.touched_folders = set()
+
+    def __enter__(self) -> "RomLibrary":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        """Shuts the process pool down, if it was created by the library."""
+        if self.is_own_executor:
+            self.executor.shutdown()
+            self.executor = None
+            self.is_own_executor = False
+
+    def path(self, rel_path) -> str:
+        return os.path.join(self.root, rel_path)
+
+    def relative(self, path) -> str:
+        return os.path.relpath(path, self.root)
+
+    def refresh(self) -> dict:
+        """Scans the library again. Returns {path: FileEntry} of all ROM files."""
+        self.meta_files = []
+        empty_folders = []
+        self.entries = {e.path: e for e in scanner.scan(self.root, meta_files_found=self.meta_files,
+                                                        empty_folders_found=empty_folders)}
+        self.touched_folders.update(empty_folders)
+        return self.entries
+
+    def files(self) -> list[str]:
+        """Paths of all ROM files, the library is scanned on the first call only."""
+        if self.entries is None:
+            self.refresh()
+        return list(self.entries)
+
+    def forget(self, rel_path):
+        self.entries.pop(rel_path, None)
+        self.touched_folders.add(os.path.dirname(rel_path))
+
+    def moved(self, rel_path, new_rel_path):
+        self.entries.pop(rel_path, None)
+        self.touched_folders.add(os.path.dirname(rel_path))
+        stat = os.stat(self.path(new_rel_path))
+        self.entries[new_rel_path] = scanner.FileEntry(new_rel_path, stat.st_size, stat.st_mtime_ns)
+
+    def remove_duplicates(self, action=Action.KEEP_ALL, is_dry_run=False, is_debug_log=False):
+        """
+        Removes duplicates (see duplicates.plan_duplicates), yielding a PlanEntry for every file, kept or removed.
+        'ask' is not supported here, there is nobody to ask. With 'is_dry_run' nothing is removed.
+        """
+        if action not in (Action.KEEP_ALL, Action.KEEP_ONE):
+            raise ValueError(f"Unsupported duplicates removal action: {action}")
+        plan = duplicates.plan_duplicates([self.path(f) for f in self.files()], action, True, is_debug_log,
+                                          is_summary=False)
+        if not is_dry_run:
+            duplicates.execute_plan(plan)
+        for e in plan.entries:
+            e = e._replace(path=self.relative(e.path))
+            if not e.is_kept and not is_dry_run:
+                self.forget(e.path)
+            yield e
+
+    def get_target_folder(self, rel_path, sort_options=CategoryOption(0),
+                          separation_options=CategoryOption.HOMEBREW | CategoryOption.PIRATES,
+                          subfolders=None, exclude_tags=None, is_reverse=False, folder_rules=None) -> str:
+        """
+        The folder, relative to the root, where sorting would place the file.
+        'folder_rules' are rules.FolderRules, like --folders-file, 'subfolders' and 'exclude_tags' are added to them.
+        """
+        if is_reverse:
+            return ""
+        folder_rules = get_folder_rules(folder_rules, subfolders, exclude_tags)
+        return get_new_folder(os.path.basename(rel_path), separation_options, sort_options, folder_rules)
+
+    def sort(self, sort_options=CategoryOption(0), separation_options=CategoryOption.HOMEBREW | CategoryOption.PIRATES,
+             subfolders=None, exclude_tags=None, is_reverse=False, folder_rules=None):
+        """
+        Sorts files into lettered and special folders, like 'romlm -s', yielding a Move for every file.
+        Hits of the 'folder_rules' are counted in them.
+        """
+        folder_rules = get_folder_rules(folder_rules, subfolders, exclude_tags)
+        files_moves = [(self.path(f), self.path(self.get_target_folder(f, sort_options, separation_options,
+                                                                        is_reverse=is_reverse,
+                                                                        folder_rules=folder_rules)))
+                       for f in self.files()]
+        for source, new_path in moves.move_files(files_moves):
+            move = Move(self.relative(source), self.relative(new_path))
+            self.moved(move.path, move.new_path)
+            yield move
+
+    def get_executor(self):
+        if self.executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=scheduler.init_worker,
+                                                initargs=(None,))
+            self.is_own_executor = True
+        return self.executor
+
+    def process(self, is_unpacking_enabled=False, is_packing_enabled=False, is_repacking_enabled=False,
+                packing_format="7z", is_solid_by_game=False):
+        """
+        Packs, extracts or repacks every file in its own folder, yielding a Processed for every file.
+        With 'is_solid_by_game' releases of the same game are packed into one solid 7z archive, like --solid-by-game.
+        """
+        tasks = [(self.path(f), os.path.dirname(self.path(f)), is_unpacking_enabled, is_packing_enabled,
+                  is_repacking_enabled, packing_format, self.root) for f in self.files()]
+        # Sizes of the scanned files, for the largest-first scheduling and the solid groups
+        sizes = {self.path(f): e.size for f, e in self.entries.items()}
+        if is_solid_by_game:
+            solid_groups, group_sizes = make_solid_groups(tasks, lambda f: sizes.get(f, 0))
+            batches = scheduler.make_batches(solid_groups, group_sizes.get, self.jobs)
+        else:
+            batches = scheduler.make_batches(tasks, lambda f: sizes.get(f, 0), self.jobs)
+        is_extracted = False
+        worker_function = process_solid_batch if is_solid_by_game else process_batch
+        for _, results in self.get_executor().map(worker_function, batches):
+            for file_name, action, result_path, seconds in results:
+                result = Processed(self.relative(file_name), action,
+                                   self.relative(result_path) if result_path is not None else None, seconds)
+                if action == "extract":
+                    self.forget(result.path)
+                    is_extracted = True
+                elif action is not None:
+                    self.moved(result.path, result.output)
+                yield result
+        # Extracted files are found by the next scan
+        if is_extracted:
+            self.entries = None
+
+    def extract(self):
+        return self.process(is_unpacking_enabled=True)
+
+    def pack(self, packing_format="7z", is_solid_by_game=False):
+        return self.process(is_packing_enabled=True, packing_format=packing_format, is_solid_by_game=is_solid_by_game)
+
+    def repack(self, packing_format):
+        return self.process(is_repacking_enabled=True, packing_format=packing_format)
+
+    def cleanup(self):
+        """Removes meta files found by the last scan and the folders emptied by the operations."""
+        remove_meta_files([self.path(f) for f in self.meta_files])
+        self.touched_folders.update(os.path.dirname(f) for f in self.meta_files)
+        self.meta_files = []
+        remove_empty_folders([self.path(f) for f in self.touched_folders if f], self.root)
+        self.touched_folders.clear()
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import heapq
+from datetime import datetime, timezone
+
+# Number of the slowest processed files kept in the report
+slowest_files_count = 10
+
+class Phase:
+    __slots__ = ("name", "seconds", "files", "bytes")
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, files=1, size=0):
+        self.files += files
+        self.bytes += size
+
+class PhaseTimer:
+    __slots__ = ("phase", "start")
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self) -> Phase:
+        self.start = time.perf_counter()
+        return self.phase
+
+    def __exit__(self, *exc):
+        self.phase.seconds += time.perf_counter() - self.start
+        return False
+
+class Metrics:
+    """
+    Timings of the run phases, with files and bytes processed by each of them, per-worker throughput
+    and the slowest processed files. Cheap enough to be always collected, only reported when asked.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.workers = {}
+        self.slowest = []
+        # Kind of the workers files were processed by, 'process' or 'thread'
+        self.executor = None
+
+    def get(self, name) -> Phase:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name)
+        return phase
+
+    def phase(self, name) -> PhaseTimer:
+        """Context to time a phase, gives the Phase to count its files. Phases with the same name are summed up."""
+        return PhaseTimer(self.get(name))
+
+    def timed(self, name, iterable):
+        """Iterates over 'iterable', timing only the time spent in it, not in the loop body of the caller."""
+        phase = self.get(name)
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, None)
+            phase.seconds += time.perf_counter() - start
+            if item is None:
+                return
+            yield item
+
+    def record_file(self, worker, path, seconds, size):
+        """Record a file processed by a worker (its process or thread id) in 'seconds'."""
+        stats = self.workers.get(worker)
+        if stats is None:
+            stats = self.workers[worker] = [0, 0, 0.0]
+        stats[0] += 1
+        stats[1] += size
+        stats[2] += seconds
+        item = (seconds, path, size)
+        if len(self.slowest) < slowest_files_count:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def report(self) -> dict:
+        def rate(count, seconds) -> float:
+            return round(count / seconds, 1) if seconds > 0 else None
+
+        return {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "argv": sys.argv[1:],
+            "cpus": os.cpu_count(),
+            "total_seconds": round(time.perf_counter() - self.start, 4),
+            "executor": self.executor,
+            "phases": [{
+                "name": p.name,
+                "seconds": round(p.seconds, 4),
+                "files": p.files,
+                "bytes": p.bytes,
+                "files_per_sec": rate(p.files, p.seconds),
+                "bytes_per_sec": rate(p.bytes, p.seconds),
+            } for p in self.phases.values()],
+            "workers": [{
+                "pid": pid,
+                "files": files,
+                "bytes": size,
+                "busy_seconds": round(seconds, 4),
+                "files_per_sec": rate(files, seconds),
+                "bytes_per_sec": rate(size, seconds),
+            } for pid, (files, size, seconds) in sorted(self.workers.items())],
+            "slowest_files": [{
+                "path": path,
+                "seconds": round(seconds, 4),
+                "bytes": size,
+            } for seconds, path, size in sorted(self.slowest, reverse=True)],
+        }
+
+    def save(self, path, extra=None):
+        report = self.report()
+        if extra:
+            report.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    def print(self):
+        total = time.perf_counter() - self.start
+        executor = f", {self.executor} workers" if self.executor is not None else ""
+        print(f"Profile ({total:.2f}s total{executor}):")
+        for p in self.phases.values():
+            files = f", {p.files} files" if p.files else ""
+            size = f", {p.bytes / (1024 * 1024):.1f} MB" if p.bytes else ""
+            print(f" | {p.name:<24} {p.seconds:>9.3f}s{files}{size}")
+        for pid, (files, size, seconds) in sorted(self.workers.items()):
+            speed = f"{files / seconds:.1f} files/s" if seconds > 0 else "-"
+            print(f" | worker {pid:<17} {seconds:>9.3f}s, {files} files, {speed}")
+        for seconds, path, _ in sorted(self.slowest, reverse=True):
+            print(f" | slow {seconds:>28.3f}s {path}")
@@ -0,0 +1,75 @@
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Moves to time before deciding if the storage is slow enough to rename files concurrently
+latency_probe_size = 32
+# Average seconds per rename above which the storage is considered high-latency (network shares, etc.)
+high_latency_threshold = 0.0005
+move_workers = 16
+
+class FolderCache:
+    """
+    Creates every folder only once, and remembers the device of the folders to detect cross-filesystem moves.
+    Thread-safe, so can be shared between threads.
+    """
+
+    def __init__(self):
+        self.created = set()
+        self.devices = {}
+        self.lock = threading.Lock()
+
+    def ensure(self, folder):
+        if not folder or folder in self.created:
+            return
+        os.makedirs(folder, exist_ok=True)
+        with self.lock:
+            self.created.add(folder)
+
+    def device(self, folder) -> int:
+        dev = self.devices.get(folder)
+        if dev is None:
+            dev = os.stat(folder or ".").st_dev
+            with self.lock:
+                self.devices[folder] = dev
+        return dev
+
+def move_file(source, target_folder, folders) -> str:
+    new_path = os.path.join(target_folder, os.path.basename(source))
+    if os.path.normpath(new_path) == os.path.normpath(source):
+        return new_path
+    if folders.device(os.path.dirname(source)) == folders.device(target_folder):
+        os.rename(source, new_path)
+    else:
+        shutil.move(source, new_path)
+    return new_path
+
+def move_files(moves, folders=None, workers=None):
+    """
+    Moves files from the list of (source, target_folder), yielding (source, new_path) for every moved file.
+    All target folders are created up front, once each. Renames go concurrently if the storage turns out
+    to be slow, like network shares.
+    """
+    folders = folders or FolderCache()
+    for folder in {target for _, target in moves}:
+        folders.ensure(folder)
+
+    # Probe the storage latency with the first moves
+    probe = moves[:latency_probe_size]
+    start = time.perf_counter()
+    for source, target_folder in probe:
+        yield source, move_file(source, target_folder, folders)
+    rest = moves[len(probe):]
+    if not rest:
+        return
+
+    if (time.perf_counter() - start) / max(len(probe), 1) < high_latency_threshold:
+        for source, target_folder in rest:
+            yield source, move_file(source, target_folder, folders)
+    else:
+        with ThreadPoolExecutor(max_workers=workers or move_workers, thread_name_prefix="romlm-move") as executor:
+            new_paths = executor.map(lambda m: move_file(m[0], m[1], folders), rest)
+            for (source, _), new_path in zip(rest, new_paths):
+                yield source, new_path
@@ -1,17 +1,25 @@
 import sys
 import os
-import shutil
-import glob
+import time
+import threading
 from enum import Flag, auto
-import py7zr
-import zipfile
+from typing import Optional
 import colorama
 from colorama import Fore, Style
 from tqdm import tqdm
-from multiprocessing import Pool, freeze_support
 
 import tags
 import duplicates
+import rules
+import scanner
+import moves
+import scheduler
+import metrics
+import events
+import journal
+
+# Archives, the library index, DATs, multiprocessing and the profiler are imported only by the operations using them,
+# as romlm is often started many times from scripts and pool workers import this module again on some systems
 
 version = "1.0.3"
 
@@ -19,7 +27,9 @@ def print_help():
 	print("Usage: \033[1mromlm\033[0m [parameters]")
 	print("Parameters:\n")
 	print("-i, --input [folder]         Specify the input folder.")
-	print("                             Default is the current folder.\n")
+	print("                             Default is the current folder. Can be used many times,")
+	print("                             to process many libraries with one pool of workers.\n")
+	print("--roots-file [file]          Read input folders from the [file], one per line.\n")
 	print("-s, --sort [options]         Sort files into lettered subfolders (A-Z).")
 	print("                             Options indicates is special folders should be")
 	print("                             also sorted. Can be:")
@@ -32,6 +42,11 @@ def print_help():
 	print("-x, --extract                Extract all 7z/zip files in the folder.\n")
 	print("-p, --pack [format]          Pack all files in the folder to 7z/zip format.")
 	print("                             [format] can be '7z' or 'zip'. Default is '7z'.\n")
+	print("--solid-by-game              With --pack 7z, pack all releases of the same game (and")
+	print("                             disc) in a folder into one solid archive, named after it.\n")
+	print("--repack [format]            Convert all 7z/zip archives in the folder to another format,")
+	print("                             without extracting them to the disk first.")
+	print("                             [format] can be '7z' or 'zip'.\n")
 	print("-u, --unlicensed [options]   Disable Homebrew and Pirate stuff separation")
 	print("                             to the different folders. [options] can be:")
 	print("                             'h' - separate homebrew only")
@@ -44,11 +59,53 @@ def print_help():
 	print("                             'all' - will keep all best files.")
 	print("                             'one' - will keep only one best file (at random).")
 	print("                             If --log, default is 'ask', otherwise 'all'.")
-	print("                             --log is recommended for this process.\n")
+	print("                             --log is recommended for this process.")
+	print("                             Decisions are remembered in the '.romlm.decisions' file,")
+	print("                             so unchanged games are not scored or asked about again.\n")
+	print("--forget-decisions           Forget the remembered duplicates decisions.\n")
+	print("--scoring [file]             Load the duplicates scoring rules (priorities of regions")
+	print("                             and languages) from the JSON [file]. See the README.\n")
+	print("--dedupe-content             Remove files with identical content, whatever their names")
+	print("                             are. The best named file of them is kept. With --index,")
+	print("                             hashes are kept for the next runs.\n")
+	print("--verify [dat]               Verify files against the Logiqx XML DAT file (no-intro, etc.).")
+	print("                             Archives are checked by CRCs from their headers, without")
+	print("                             unpacking. Runs before any other operation. With --index,")
+	print("                             hashes of loose files are kept for the next runs.\n")
+	print("--dry-run [file]             Only show what --remove-duplicates would do, without")
+	print("                             changing anything. If [file] is specified, the plan")
+	print("                             is saved there as JSON instead.\n")
 	print("-f, --folders [list]         Define subfolders to place files, based on tags.\n")
 	print("-e, --exclude [list]         Exclude files with specified tags from -f process.\n")
+	print("--folders-file [file]        Load rules of user-defined folders from the JSON [file]:")
+	print("                             tags of every folder, with priorities and excluded tags.")
+	print("                             Can be combined with -f, its folders go after. See the README.\n")
+	print("--watch                      After the run, keep watching the folder and apply the same")
+	print("                             operations to every new or changed file, until Ctrl+C.")
+	print("                             Uses inotify on Linux, polling elsewhere.\n")
 	print("-h, --help                   Show this help message.\n")
 	print("-l, --log                    Enable full logging instead of progressbars.\n")
+	print("--log-file [file]            Also write the log of every decision and processed file")
+	print("                             to the [file], from a background thread.\n")
+	print("--log-format [format]        Format of the --log-file, 'text' or 'jsonl' (one JSON")
+	print("                             record per line). Default is 'text'.\n")
+	print("-j, --jobs [number]          Number of worker processes for --pack and --extract.")
+	print("                             Default is the number of CPU cores.\n")
+	print("--io-jobs [number]           Max number of large files processed at the same time,")
+	print("                             to not thrash spinning disks. Not limited by default.\n")
+	print("--executor [type]            Workers for --pack and --extract: 'process', 'thread' or")
+	print("                             'auto'. Threads skip the cost of starting processes and are")
+	print("                             as fast on zip, 'auto' picks them for zip and small")
+	print("                             workloads. Default is 'auto'.\n")
+	print("--resume                     Continue an interrupted --pack, --extract or --repack run")
+	print("                             from its journal, skipping the files already done.\n")
+	print("--index                      Keep an index of the library in the '.romlm.db' file,")
+	print("                             to skip unchanged files on the next runs.\n")
+	print("--reindex                    Rebuild the library index from scratch.\n")
+	print("--profile [file]             Print timings of every phase of the run, per-worker throughput")
+	print("                             and the slowest files. If [file] is specified, a cProfile")
+	print("                             dump of the main process is saved there.\n")
+	print("--metrics-file [file]        Save the timings and other run metrics to the JSON [file].\n")
 	print("For more details and examples or to support an author,")
 	print("please check the README file or visit the GitHub repository:")
 	print(f"{Fore.CYAN}https://github.com/ManeFunction/romlm{Style.RESET_ALL}")
@@ -58,10 +115,27 @@ class CategoryOption(Flag):
 	PIRATES = auto()
 	SUBFOLDERS = auto()
 
-def create_if_not_exist(folder):
-	if not os.path.exists(folder):
-		os.makedirs(folder)
-		
+class LibraryRoot:
+	"""State of one input folder during the run. Paths of its files are relative to it."""
+
+	def __init__(self, path):
+		self.path = path
+		self.file_entries = {}
+		# Folders where files were removed or moved out, and the meta files and empty folders found by the scan,
+		# the cleanup at the end visits only them
+		self.touched_folders = set()
+		self.meta_files = []
+		self.empty_folders = []
+		self.library_index = None
+		self.resumed = None
+		self.journal = None
+		self.plan = None
+		self.files = 0
+		self.removed = 0
+		self.moved = 0
+		self.tasks = 0
+		self.processed = 0
+
 def get_lettered_folder_name(filename) -> str:
 	folder_name = filename[0].upper() if filename else ''
 	if folder_name == "[":
@@ -73,9 +147,9 @@ def get_lettered_folder_name(filename) -> str:
 def try_add_subfolder(is_sort_subfolders, folder_name, filename) -> str:
 	return (folder_name + "/" + get_lettered_folder_name(filename)) if is_sort_subfolders else folder_name
 
-def get_new_folder(filename, separation_options, sorting_options, subfolders, excludes) -> str:
-	file_tags = tags.get_from_filename(filename)
-	excludes = {exclude.lower() for exclude in excludes} if excludes is not None else None
+def get_new_folder(filename, separation_options, sorting_options, folder_rules=None) -> str:
+	"""Returns the folder for a file, 'folder_rules' are rules.FolderRules of -f. The folder is not created here."""
+	file_tags = tags.parse(filename).tags
 	
 	# Check for 'homebrew' or 'aftermarket' tags
 	if separation_options & CategoryOption.HOMEBREW and tags.is_homebrew(file_tags):
@@ -85,79 +159,161 @@ def get_new_folder(filename, separation_options, sorting_options, subfolders, ex
 	elif separation_options & CategoryOption.PIRATES and tags.is_pirate(file_tags):
 		folder_name = try_add_subfolder(sorting_options & CategoryOption.PIRATES, "!Pirates", filename)
 
-	# Check for any user-defined 'subfolders' value matches any tag.
-	elif subfolders is not None:
-		found_subfolder = ""
-		for subfolder in subfolders:
-			if subfolder.lower() in file_tags and (excludes is None or not bool(excludes.intersection(file_tags))):
-				found_subfolder = "!" + subfolder
-				break
-		folder_name = try_add_subfolder(sorting_options & CategoryOption.SUBFOLDERS, found_subfolder, filename) \
-			if found_subfolder != "" else get_lettered_folder_name(filename)
+	# Check for the user-defined folder rule of the best matching tag
+	elif folder_rules is not None:
+		rule = folder_rules.route(file_tags)
+		folder_name = try_add_subfolder(sorting_options & CategoryOption.SUBFOLDERS, rule.folder, filename) \
+			if rule is not None else get_lettered_folder_name(filename)
 
 	# Default to alphabetical folder
 	else:
 		folder_name = get_lettered_folder_name(filename)
 
-	create_if_not_exist(folder_name)
 	return folder_name
 
-def remove_meta_files(path, is_log_enabled):
-	for dirpath, dirnames, filenames in os.walk(path):
-		for f in filenames:
-			if f.lower() in ("desktop.ini", "thumbs.db", ".ds_store"):
-				file_path = os.path.join(dirpath, f)
-				os.remove(file_path)
-				if is_log_enabled:
-					print(f"Removed meta file: {Fore.RED}{file_path}{Style.RESET_ALL}")
+def remove_meta_files(file_paths):
+	"""Removes system meta files, found by the scan, so the tree is not walked again for them."""
+	for file_path in file_paths:
+		try:
+			os.remove(file_path)
+		except FileNotFoundError:
+			continue
+		events.emit("meta_removed", path=file_path)
 
-def remove_empty_subfolders(path, is_log_enabled):
-	for dirpath, dirnames, filenames in os.walk(path, topdown=False):
-		if not dirnames and not filenames:
-			if dirpath != path:
-				os.rmdir(dirpath)
-				if is_log_enabled:
-					print(f"Removed empty folder: {Fore.RED}{dirpath}{Style.RESET_ALL}")
-				# Kinda cludgy, but keep removing empty parent folders until we hit the root, to clear empty trees
-				parent_dir = os.path.dirname(dirpath)
-				while parent_dir != path and not os.listdir(parent_dir):
-					os.rmdir(parent_dir)
-					if is_log_enabled:
-						print(f"Removed empty folder: {Fore.RED}{parent_dir}{Style.RESET_ALL}")
-					parent_dir = os.path.dirname(parent_dir)
-
-def process_file(args) -> tuple[str, str]:
-	"""Processes a single file for packing or unpacking."""
-	file_name, target_folder, is_unpacking_enabled, is_packing_enabled, packing_format = args
-	result_log = None
+def remove_empty_parents(folder, root="."):
+	"""Removes the folder and then its parents, while they are empty, up to the root folder."""
+	while folder not in ("", ".", root):
+		try:
+			os.rmdir(folder)
+		except OSError:
+			return
+		events.emit("folder_removed", path=folder)
+		folder = os.path.dirname(folder)
+
+def remove_empty_folders(folders, root="."):
+	"""
+	Removes the folders touched by the run, which are empty now, together with their emptied parents.
+	The deepest ones go first, so every folder is checked once, and nothing else in the tree is visited.
+	"""
+	for folder in sorted(set(folders), key=lambda f: (f.count(os.sep), f), reverse=True):
+		remove_empty_parents(folder, root)
+
+def process_file(args) -> tuple[str, str, str]:
+	"""
+	Processes a single file for packing or unpacking.
+	Returns the file name, the action done ('extract', 'repack', 'pack' or None) and the resulting path.
+	"""
+	file_name, target_folder, is_unpacking_enabled, is_packing_enabled, is_repacking_enabled, packing_format, root = args
 	if is_unpacking_enabled and file_name.endswith((".7z", ".zip")):
-		result_log = unpack_file(file_name, target_folder)
-	elif is_packing_enabled and not file_name.endswith((".7z", ".zip")) and not file_name.startswith("[BIOS]"):
-		result_log = pack_file(file_name, target_folder, packing_format)
-	return file_name, result_log
+		return file_name, "extract", unpack_file(file_name, target_folder)
+	elif is_repacking_enabled and file_name.endswith((".7z", ".zip")) and not file_name.endswith("." + packing_format):
+		archive_path = repack_file(file_name, target_folder, packing_format)
+		return file_name, "repack" if archive_path is not None else None, archive_path
+	elif is_packing_enabled and is_packable(file_name, root):
+		return file_name, "pack", pack_file(file_name, target_folder, packing_format)
+	return file_name, None, None
+
+def is_packable(file_name, root) -> bool:
+	return not file_name.endswith((".7z", ".zip")) and not os.path.relpath(file_name, root).startswith("[BIOS]")
+
+def init_worker(io_slots, is_journaled=False):
+	"""Pool initializer: I/O slots for the scheduler and the journals of the roots, if enabled."""
+	scheduler.init_worker(io_slots)
+	if is_journaled:
+		journal.attach(True)
+
+def process_batch(batch) -> tuple[int, list[tuple[str, str, str, float]]]:
+	"""
+	Processes a batch of files from the scheduler, holding an I/O slot for the disk-heavy ones.
+	Every file is marked as started and done in the journal of its root, so an interrupted run can be resumed.
+	Returns the worker id (its process or thread) and (file_name, action, result_path, seconds) for every file.
+	"""
+	results = []
+	for task in batch:
+		root = task[-1]
+		with scheduler.io_slot(scheduler.get_size(task[0]) >= scheduler.large_file_size):
+			journal.record(root, journal.STARTED, task[0], target=task[1])
+			start = time.perf_counter()
+			results.append(process_file(task) + (time.perf_counter() - start,))
+			journal.record(root, journal.DONE, task[0])
+	# Main thread id of a process is its pid
+	return threading.get_native_id(), results
+
+def make_solid_groups(tasks, size_of) -> tuple[list[tuple[str, list]], dict]:
+	"""
+	Groups packing tasks for --solid-by-game: files of the same game (and disc) going to the same folder are packed
+	into one archive, named after the game. A single file is packed as usual, unless its game archive already exists.
+	Returns (archive_path, tasks) items for the scheduler, the path is the file's own one for the files processed
+	as usual, and {path: size} of the items.
+	"""
+	games = {}
+	items = []
+	for task in tasks:
+		if is_packable(task[0], task[-1]):
+			archive_path = os.path.join(task[1], tags.parse(os.path.basename(task[0])).group + ".7z")
+			games.setdefault(archive_path, []).append(task)
+		else:
+			items.append((task[0], [task]))
+	for archive_path, game_tasks in games.items():
+		if len(game_tasks) == 1 and not os.path.exists(archive_path):
+			archive_path = game_tasks[0][0]
+		items.append((archive_path, game_tasks))
+	return items, {path: sum(size_of(task[0]) for task in game_tasks) for path, game_tasks in items}
+
+def process_solid_batch(batch) -> tuple[int, list[tuple[str, str, str, float]]]:
+	"""
+	Processes a batch of make_solid_groups() items, packing the files of every game into its solid archive.
+	The sources are removed only when the archive is complete. Returns the same as process_batch().
+	"""
+	import archives
+	results = []
+	for archive_path, tasks in batch:
+		if archive_path == tasks[0][0]:
+			results.extend(process_batch(tasks)[1])
+			continue
+		root = tasks[0][-1]
+		# A game of many medium files is as disk-heavy as one large file
+		is_large = sum(scheduler.get_size(task[0]) for task in tasks) >= scheduler.large_file_size
+		with scheduler.io_slot(is_large):
+			for task in tasks:
+				journal.record(root, journal.STARTED, task[0], target=task[1])
+			start = time.perf_counter()
+			archives.pack_solid([task[0] for task in tasks], archive_path)
+			for task in tasks:
+				os.remove(task[0])
+			# The time is shared by all files of the archive
+			seconds = (time.perf_counter() - start) / len(tasks)
+			for task in tasks:
+				results.append((task[0], "pack", archive_path, seconds))
+				journal.record(root, journal.DONE, task[0])
+	return threading.get_native_id(), results
 
 def unpack_file(file_name, target_folder) -> str:
-	"""Handles unpacking of a single file."""
-	if file_name.endswith(".7z"):
-		with py7zr.SevenZipFile(file_name, 'r') as archive:
-			archive.extractall(target_folder)
-	elif file_name.endswith(".zip"):
-		with zipfile.ZipFile(file_name, 'r') as archive:
-			archive.extractall(target_folder)
+	"""Handles unpacking of a single file. The archive is removed only after all files are extracted and verified."""
+	import archives
+	archives.extract(file_name, target_folder)
+	os.remove(file_name)
+	return target_folder
+
+def repack_file(file_name, target_folder, packing_format) -> Optional[str]:
+	"""
+	Handles repacking of a single archive. The source is removed only after the new archive is checked.
+	Returns None, if the archive is skipped, as its new name is taken by another one.
+	"""
+	import archives
+	try:
+		archive_path = archives.repack(file_name, target_folder, packing_format)
+	except FileExistsError:
+		return None
 	os.remove(file_name)
-	return f" >> Unpacked to: {Fore.BLUE}{target_folder}{Style.RESET_ALL}"
+	return archive_path
 
 def pack_file(file_name, target_folder, packing_format) -> str:
 	"""Handles packing of a single file."""
-	archive_path = os.path.join(target_folder, os.path.basename(file_name))
-	if packing_format == "7z":
-		with py7zr.SevenZipFile(str(archive_path) + ".7z", 'w') as archive:
-			archive.write(file_name, arcname=os.path.basename(file_name))
-	elif packing_format == "zip":
-		with zipfile.ZipFile(str(archive_path + ".zip"), 'w', zipfile.ZIP_DEFLATED) as archive:
-			archive.write(file_name, arcname=os.path.basename(file_name))
+	import archives
+	archive_path = archives.pack(file_name, target_folder, packing_format)
 	os.remove(file_name)
-	return f" >> Packed to: {Fore.BLUE}{archive_path}.{packing_format}{Style.RESET_ALL}"
+	return archive_path
 
 def is_next_optional_parameter(args, i) -> bool:
 	return i+1 < len(args) and not args[i+1].startswith("-")
@@ -177,6 +333,7 @@ def mane():
 	is_reverse_sort = False
 	is_unpacking_enabled = False
 	is_packing_enabled = False
+	is_repacking_enabled = False
 	packing_format = "7z"
 	is_log_enabled = False
 	is_debug_log = False
@@ -184,7 +341,26 @@ def mane():
 	remove_duplicates_action = duplicates.Action.NOT_DEFINED
 	subfolders = None
 	exclude_tags = None
-	input_folder = "."
+	folder_rules = None
+	input_folders = []
+	is_index_enabled = False
+	is_reindex = False
+	is_dry_run = False
+	is_dedupe_content = False
+	verify_dat = None
+	jobs = os.cpu_count() or 1
+	io_jobs = None
+	executor = "auto"
+	dry_run_file = None
+	is_profile_enabled = False
+	profile_file = None
+	metrics_file = None
+	log_file = None
+	log_format = "text"
+	is_watch_enabled = False
+	is_resume = False
+	is_solid_by_game = False
+	is_forget_decisions = False
 
 	colorama.init()
 
@@ -212,6 +388,16 @@ def mane():
 					print(f"{Fore.RED}Error: Unknown format '{pack_param}'! --pack only supports '7z' or 'zip'.{Style.RESET_ALL}")
 					sys.exit(1)
 				skip_next = True
+		elif arg == "--solid-by-game":
+			is_solid_by_game = True
+		elif arg == "--repack":
+			is_repacking_enabled = True
+			if i+1 < len(args) and args[i+1] in ("7z", "zip"):
+				packing_format = args[i+1]
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --repack requires a format, '7z' or 'zip'.{Style.RESET_ALL}")
+				sys.exit(1)
 		elif arg in ("-u", "--unlicensed"):
 			if is_next_optional_parameter(args, i):
 				keep_params = args[i+1]
@@ -246,8 +432,87 @@ def mane():
 				skip_next = True
 		elif arg in ("-l", "--log"):
 			is_log_enabled = True
+		elif arg == "--log-file":
+			if i+1 < len(args):
+				log_file = os.path.abspath(args[i+1])
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --log-file requires a file path.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--log-format":
+			if i+1 < len(args) and args[i+1] in events.log_formats:
+				log_format = args[i+1]
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --log-format requires a format, 'text' or 'jsonl'.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--resume":
+			is_resume = True
+		elif arg == "--watch":
+			is_watch_enabled = True
 		elif arg == "--debug":
 			is_debug_log = True
+		elif arg == "--verify":
+			if i+1 < len(args):
+				verify_dat = os.path.abspath(args[i+1])
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --verify requires a DAT file path.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--scoring":
+			if i+1 < len(args):
+				try:
+					rules.use(rules.load(args[i+1]))
+				except ValueError as e:
+					print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
+					sys.exit(1)
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --scoring requires a JSON file path.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--forget-decisions":
+			is_forget_decisions = True
+		elif arg == "--dedupe-content":
+			is_dedupe_content = True
+		elif arg == "--dry-run":
+			is_dry_run = True
+			if is_next_optional_parameter(args, i):
+				dry_run_file = os.path.abspath(args[i+1])
+				skip_next = True
+		elif arg in ("-j", "--jobs", "--io-jobs"):
+			if i+1 < len(args) and args[i+1].isdigit() and int(args[i+1]) > 0:
+				if arg == "--io-jobs":
+					io_jobs = int(args[i+1])
+				else:
+					jobs = int(args[i+1])
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: {arg} requires a positive number.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--executor":
+			if i+1 < len(args) and args[i+1] in scheduler.executors:
+				executor = args[i+1]
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --executor requires a type, 'process', 'thread' or 'auto'.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--profile":
+			is_profile_enabled = True
+			if is_next_optional_parameter(args, i):
+				profile_file = os.path.abspath(args[i+1])
+				skip_next = True
+		elif arg == "--metrics-file":
+			if i+1 < len(args):
+				metrics_file = os.path.abspath(args[i+1])
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --metrics-file requires a file path.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--index":
+			is_index_enabled = True
+		elif arg == "--reindex":
+			is_index_enabled = True
+			is_reindex = True
 		elif arg in ("-r", "--remove-duplicates"):
 			is_remove_duplicates = True
 			if is_next_optional_parameter(args, i):
@@ -280,9 +545,28 @@ def mane():
 			else:
 				print(f"{Fore.RED}Error: --exclude requires a comma-separated list of tags.{Style.RESET_ALL}")
 				sys.exit(1)
+		elif arg == "--folders-file":
+			if i+1 < len(args):
+				try:
+					folder_rules = rules.load_folders(args[i+1])
+				except ValueError as e:
+					print(f"{Fore.RED}Error: {e}{Style.RESET_ALL}")
+					sys.exit(1)
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --folders-file requires a JSON file path.{Style.RESET_ALL}")
+				sys.exit(1)
+		elif arg == "--roots-file":
+			if i+1 < len(args) and os.path.isfile(args[i+1]):
+				with open(args[i+1], "r", encoding="utf-8") as f:
+					input_folders.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+				skip_next = True
+			else:
+				print(f"{Fore.RED}Error: --roots-file requires an existing file with one folder per line.{Style.RESET_ALL}")
+				sys.exit(1)
 		elif arg in ("-i", "--input"):
 			if i+1 < len(args):
-				input_folder = args[i+1]
+				input_folders.append(args[i+1])
 				skip_next = True
 			else:
 				print(f"{Fore.RED}Error: --input requires a folder path.{Style.RESET_ALL}")
@@ -297,86 +581,673 @@ def mane():
 		print(f"{Fore.RED}Error: You cannot --extract and --pack at the same time.{Style.RESET_ALL}")
 		sys.exit(1)
 
+	if is_repacking_enabled is True and (is_unpacking_enabled is True or is_packing_enabled is True):
+		print(f"{Fore.RED}Error: You cannot --repack together with --extract or --pack.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if is_solid_by_game and not (is_packing_enabled and packing_format == "7z"):
+		print(f"{Fore.RED}Error: --solid-by-game can only be used with --pack 7z.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if log_format != "text" and log_file is None:
+		print(f"{Fore.RED}Error: --log-format can only be used with --log-file.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if is_dry_run and not is_remove_duplicates and not is_dedupe_content:
+		print(f"{Fore.RED}Error: --dry-run can only be used with --remove-duplicates or --dedupe-content.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if is_dry_run and (is_sort_enabled or is_unpacking_enabled or is_packing_enabled or is_repacking_enabled):
+		print(f"{Fore.YELLOW}Warning: --dry-run only previews duplicates removal, other operations are skipped.{Style.RESET_ALL}")
+
+	if is_resume and not (is_unpacking_enabled or is_packing_enabled or is_repacking_enabled):
+		print(f"{Fore.RED}Error: --resume can only be used with --pack, --extract or --repack.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	if is_watch_enabled and (is_dry_run or verify_dat is not None):
+		print(f"{Fore.RED}Error: --watch cannot be used with --dry-run or --verify.{Style.RESET_ALL}")
+		sys.exit(1)
+
 	if (is_sort_enabled is False
 			and is_unpacking_enabled is False
 			and is_packing_enabled is False
-			and is_remove_duplicates is False):
+			and is_repacking_enabled is False
+			and is_remove_duplicates is False
+			and is_dedupe_content is False
+			and verify_dat is None):
 		print(f"{Fore.YELLOW}Nothing to do...{Style.RESET_ALL}")
 		sys.exit()
 
-	if not os.path.exists(input_folder):
-		print(f"{Fore.RED}Error: The specified input folder '{input_folder}' does not exist.{Style.RESET_ALL}")
+	if verify_dat is not None and not os.path.isfile(verify_dat):
+		print(f"{Fore.RED}Error: The specified DAT file '{verify_dat}' does not exist.{Style.RESET_ALL}")
 		sys.exit(1)
-	os.chdir(input_folder)
-	print(f"Current working directory set to: {os.getcwd()}")
 
-	if exclude_tags is not None and subfolders is None:
+	input_folders = input_folders or ["."]
+	roots = []
+	for folder in input_folders:
+		if not os.path.exists(folder):
+			print(f"{Fore.RED}Error: The specified input folder '{folder}' does not exist.{Style.RESET_ALL}")
+			sys.exit(1)
+		path = os.path.abspath(folder)
+		if all(root.path != path for root in roots):
+			roots.append(LibraryRoot(path))
+	for root in roots:
+		for other in roots:
+			if other.path.startswith(root.path.rstrip(os.sep) + os.sep):
+				print(f"{Fore.RED}Error: Input folders can't be nested: '{other.path}' is inside '{root.path}'.{Style.RESET_ALL}")
+				sys.exit(1)
+
+	if is_watch_enabled and len(roots) > 1:
+		print(f"{Fore.RED}Error: --watch can only be used with a single input folder.{Style.RESET_ALL}")
+		sys.exit(1)
+
+	# Per-file log goes through events, rendered as colored text with --log, and written to the --log-file
+	events.configure(is_log_enabled, log_file, log_format)
+
+	# Phases are always timed, it's cheap, but reported only if asked
+	run_metrics = metrics.Metrics()
+	profiler = None
+	if profile_file is not None:
+		import cProfile
+		profiler = cProfile.Profile()
+		profiler.enable()
+
+	def report_metrics():
+		if profiler is not None:
+			profiler.disable()
+			profiler.dump_stats(profile_file)
+			print(f"cProfile dump saved to: {Fore.BLUE}{profile_file}{Style.RESET_ALL}")
+		if is_profile_enabled:
+			run_metrics.print()
+		if metrics_file is not None:
+			run_metrics.save(metrics_file, {"cprofile": profile_file, "roots": [{
+				"path": root.path,
+				"files": root.files,
+				"removed": root.removed,
+				"moved": root.moved,
+				"processed": root.processed,
+			} for root in roots], "folder_rules": folder_rules.report() if folder_rules is not None else None})
+			print(f"Metrics saved to: {Fore.BLUE}{metrics_file}{Style.RESET_ALL}")
+
+	if exclude_tags is not None and subfolders is None and folder_rules is None:
 		print(f"{Fore.YELLOW}Warning: You cannot use --exclude without --subfolders. Option ignored.{Style.RESET_ALL}")
+	# Rules of the rules file and -f are compiled once, into one index of tags
+	is_folders_file = folder_rules is not None
+	if subfolders is not None:
+		folder_rules = (folder_rules or rules.FolderRules([])).extended(subfolders, exclude_tags)
+	elif folder_rules is not None and exclude_tags is not None:
+		folder_rules = folder_rules.extended(exclude_tags=exclude_tags)
 
-	# Get files list
-	files_list = glob.glob("**/*.*", recursive=True)
+	# Signature of the processing, to skip files already processed the same way
+	process_action = []
+	if is_sort_enabled:
+		process_action.append("sort:reverse" if is_reverse_sort else
+							  f"sort:{separation_options.value}:{sort_options.value}:{subfolders}:{exclude_tags}"
+							  + (f":{folder_rules.digest}" if is_folders_file else ""))
+	if is_unpacking_enabled:
+		process_action.append("extract")
+	if is_packing_enabled:
+		process_action.append(f"pack:{packing_format}:solid" if is_solid_by_game else f"pack:{packing_format}")
+	if is_repacking_enabled:
+		process_action.append(f"repack:{packing_format}")
+	process_action = "+".join(process_action)
 
-	# If duplicates removal is enabled, do it first
-	if is_remove_duplicates:
-		files_was = len(files_list)
-		files_list = duplicates.clean_duplicates(files_list, remove_duplicates_action, is_log_enabled, is_debug_log)
-		if files_was != len(files_list):
-			print(f"Total ROMs left after duplicates removal: {Fore.GREEN}{len(files_list)}{Style.RESET_ALL} "
-				  f"out of {Fore.RED}{files_was}{Style.RESET_ALL}")
-		else:
-			print("No duplicates found...")
-		
-	def get_target_folder() -> str:
+	is_pool_run = is_unpacking_enabled or is_packing_enabled or is_repacking_enabled
+	# Packing and extracting can start while the folders tree is still being scanned,
+	# all other operations need the full list, like games for the solid packing
+	is_streaming = (is_pool_run and not is_remove_duplicates and not is_dedupe_content and not is_index_enabled
+					and verify_dat is None and not is_solid_by_game)
+
+	def get_target_folder(file_name) -> str:
 		if is_sort_enabled:
 			if is_reverse_sort:
 				return '.'
-			return get_new_folder(os.path.basename(file_name), separation_options, sort_options,
-										   subfolders, exclude_tags)
+			return get_new_folder(os.path.basename(file_name), separation_options, sort_options, folder_rules)
 		return os.path.dirname(file_name)
-		
-	# Process files
-	if is_sort_enabled is True or is_unpacking_enabled is True or is_packing_enabled is True:
+
+	# Pack/extract tasks of all roots go to one pool, with absolute paths, this maps them back to (root, path)
+	owners = {}
+
+	def prepare_root(root):
+		"""
+		Scans, verifies, dedupes and sorts one input folder. Returns its pack/extract tasks,
+		a generator if they are streamed while the folder is still being scanned.
+		"""
+		os.chdir(root.path)
+		print(f"Current working directory set to: {os.getcwd()}")
+		file_entries = root.file_entries
+		touched_folders = root.touched_folders
+
+		# An interrupted pack/extract run left its journal, continue it if asked
+		if is_pool_run and not is_dry_run:
+			resumed = journal.read(journal.file_name)
+			if resumed is not None and resumed.action != process_action:
+				if is_resume:
+					print(f"{Fore.YELLOW}Warning: The interrupted run was made with other options, starting over.{Style.RESET_ALL}")
+				resumed = None
+			elif resumed is not None and not is_resume:
+				print(f"{Fore.YELLOW}Warning: The previous run was interrupted, starting over. "
+					  f"Use --resume to continue it instead.{Style.RESET_ALL}")
+				resumed = None
+			elif resumed is None and is_resume:
+				print(f"{Fore.YELLOW}Warning: Nothing to resume, starting a new run.{Style.RESET_ALL}")
+			if resumed is not None:
+				import archives
+				# Only the files a worker was busy with may have left partial outputs, all of them are temporary files
+				partial = sum(archives.remove_temp_files(folder) for folder in resumed.partial_folders())
+				print(f"Resuming the interrupted run: {Fore.GREEN}{len(resumed.remaining())}{Style.RESET_ALL} files left "
+					  f"out of {len(resumed.planned)}, partial outputs removed: {partial}")
+			root.resumed = resumed
+		resumed = root.resumed
+
+		def scan_files():
+			scan_phase = run_metrics.get("scan")
+			for entry in run_metrics.timed("scan", scanner.scan(root.path, meta_files_found=root.meta_files,
+																empty_folders_found=root.empty_folders)):
+				file_entries[entry.path] = entry
+				scan_phase.add(1, entry.size)
+				root.files += 1
+				yield entry.path
+
+		is_root_streaming = is_streaming
+		if resumed is not None and resumed.is_plan_complete:
+			# All files were planned before the interruption, so only the remaining ones are checked, with no scan
+			is_root_streaming = False
+			files_list = [f for f in resumed.remaining() if os.path.isfile(f)]
+			file_entries.update((f, scanner.FileEntry(f, resumed.planned[f], 0)) for f in files_list)
+			root.files = len(files_list)
+		else:
+			files_list = scan_files()
+			if not is_root_streaming:
+				files_list = list(files_list)
+
+		# Load the library index, to skip files that were not changed since the previous run
+		library_index = None
+		if is_index_enabled and not is_dry_run:
+			import index
+			with run_metrics.phase("index") as phase:
+				library_index = index.LibraryIndex(".", is_reindex)
+				unchanged = library_index.refresh(file_entries.values())
+				phase.add(len(file_entries))
+			print(f"Unchanged files in the library index: {Fore.GREEN}{len(unchanged)}{Style.RESET_ALL} "
+				  f"out of {len(files_list)}")
+		root.library_index = library_index
+
+		# Content hashes are shared by the verification and the identical files removal,
+		# and kept for the next runs only in the library index
+		hash_cache = None
+
+		# Verify files against the DAT, before anything is changed
+		if verify_dat is not None:
+			print(">> Verifying files against the DAT...")
+			import index
+			import dat
+			with run_metrics.phase("verify") as phase:
+				dat_file = dat.Dat(verify_dat)
+				hash_cache = index.HashCache("." if is_index_enabled else None, is_reindex)
+				counts = {status: 0 for status in dat.Status}
+				results = dat.verify(dat_file, [file_entries[f] for f in files_list], hash_cache)
+				if not is_log_enabled:
+					results = tqdm(results, desc="Verifying", total=len(files_list))
+				def report(file_results):
+					for r in file_results:
+						counts[r.status] += 1
+						events.emit("verify", path=r.path, member=r.member, status=r.status.value, expected=r.expected)
+						# Without --log only problems are shown, above the progress bar
+						if r.status != dat.Status.HAVE and not is_log_enabled:
+							tqdm.write(events.render({"event": "verify", "path": r.path, "member": r.member,
+													  "status": r.status.value, "expected": r.expected}))
+
+				for file_results in results:
+					report(file_results)
+				# ROMs of the DAT are known to be missing only after all files are checked
+				report(dat_file.missing())
+				if not is_dedupe_content:
+					hash_cache.save(files_list)
+				phase.add(len(files_list))
+			print(f"DAT: {dat_file.name or os.path.basename(verify_dat)}\n"
+				  f"Have: {Fore.GREEN}{counts[dat.Status.HAVE]}{Style.RESET_ALL}, "
+				  f"bad name: {Fore.YELLOW}{counts[dat.Status.BAD_NAME]}{Style.RESET_ALL}, "
+				  f"unknown: {Fore.BLUE}{counts[dat.Status.UNKNOWN]}{Style.RESET_ALL}, "
+				  f"miss: {Fore.RED}{counts[dat.Status.MISS]}{Style.RESET_ALL}")
+
+		# Remove files with identical content first, whatever their names are
+		content_plan = None
+		if is_dedupe_content:
+			print(">> Looking for files with identical content...")
+			import index
+			import hashes
+			with run_metrics.phase("dedupe-content") as phase:
+				phase.add(len(files_list))
+				if hash_cache is None:
+					hash_cache = index.HashCache("." if is_index_enabled else None, is_reindex)
+				identical = hashes.find_identical([file_entries[f] for f in files_list], hash_cache)
+				hash_cache.save(files_list)
+				content_plan = duplicates.plan_content_duplicates(identical)
+				removed = set(content_plan.removed)
+				if not is_dry_run:
+					duplicates.execute_plan(content_plan)
+					touched_folders.update(os.path.dirname(f) for f in removed)
+					root.removed += len(removed)
+					if library_index is not None:
+						for f in removed:
+							library_index.forget(f)
+				files_list = [f for f in files_list if f not in removed]
+			print(f"Files with identical content {'would be removed' if is_dry_run else 'removed'}: "
+				  f"{Fore.RED}{len(removed)}{Style.RESET_ALL}")
+
+		# Only make the duplicates removal plan
+		if is_dry_run:
+			if not is_remove_duplicates:
+				root.plan = content_plan
+			else:
+				root.plan = duplicates.plan_duplicates(files_list, remove_duplicates_action, is_log_enabled, is_debug_log,
+													   decisions=duplicates.DecisionCache(".", is_forget_decisions))
+				if content_plan is not None:
+					root.plan.entries[:0] = [e for e in content_plan.entries if not e.is_kept]
+			return []
+
+		# If duplicates removal is enabled, do it first
+		if is_remove_duplicates:
+			with run_metrics.phase("dedupe") as phase:
+				files_was = len(files_list)
+				# Files survived the removal by other scoring rules are decided again
+				dedupe_signature = f"{remove_duplicates_action.name.lower()}:{rules.active.digest}"
+				resolved = library_index.resolved_groups(dedupe_signature) if library_index is not None else None
+				files_before = files_list
+				decisions = duplicates.DecisionCache(".", is_forget_decisions)
+				files_list = duplicates.clean_duplicates(files_list, remove_duplicates_action, is_log_enabled, is_debug_log,
+														 resolved, decisions)
+				decisions.save()
+				if len(files_list) != files_was:
+					kept = set(files_list)
+					touched_folders.update(os.path.dirname(f) for f in files_before if f not in kept)
+					root.removed += files_was - len(files_list)
+				if library_index is not None:
+					library_index.mark_deduped(files_list, dedupe_signature)
+				phase.add(files_was)
+			if files_was != len(files_list):
+				print(f"Total ROMs left after duplicates removal: {Fore.GREEN}{len(files_list)}{Style.RESET_ALL} "
+					  f"out of {Fore.RED}{files_was}{Style.RESET_ALL}")
+			else:
+				print("No duplicates found...")
+
+		folders = moves.FolderCache()
+
+		def is_done(f) -> bool:
+			return library_index is not None and library_index.is_done(f, process_action)
+
 		# Single-threaded processing for just a move operation
-		if not is_unpacking_enabled and not is_packing_enabled:
+		if is_sort_enabled and not is_pool_run:
 			print(">> Processing files...")
-			progress = files_list if is_log_enabled else tqdm(files_list, desc="Processing")
-			
-			for file_name in progress:
-				target_folder = get_target_folder()
-				shutil.move(file_name, os.path.join(target_folder, os.path.basename(str(file_name))))
-				if is_log_enabled:
-					print(f" >> Moved to: {Fore.BLUE}{target_folder}{Style.RESET_ALL}")
-		else:
-			# Multithreaded processing for packing/unpacking
-			print(">> Preparing processing...")
-			tasks = []
+			with run_metrics.phase("folders") as phase:
+				files_moves = [(f, get_target_folder(f)) for f in files_list if not is_done(f)]
+				for target_folder in {target for _, target in files_moves}:
+					folders.ensure(target_folder)
+				phase.add(len(files_moves))
+			progress = None if is_log_enabled else tqdm(total=len(files_moves), desc="Processing")
+
+			with run_metrics.phase("moves") as phase:
+				for file_name, new_path in moves.move_files(files_moves, folders):
+					touched_folders.add(os.path.dirname(file_name))
+					if library_index is not None:
+						library_index.move(file_name, os.path.normpath(new_path), process_action)
+					events.emit("move", path=file_name, target=new_path)
+					if progress is not None:
+						progress.update(1)
+				phase.add(len(files_moves))
+			root.moved = len(files_moves)
+			elapsed = phase.seconds
+			if progress is not None:
+				progress.close()
+			print(f"Moved {len(files_moves)} files in {elapsed:.2f}s "
+				  f"({len(files_moves) / elapsed if elapsed > 0 else 0:.0f} files/s)")
+		if not is_pool_run:
+			return []
+
+		# Files are journaled as planned when their batch goes to the pool, and then by the workers
+		root.journal = journal.Journal(os.path.join(root.path, journal.file_name), is_new=resumed is None)
+		if resumed is None:
+			root.journal.write([{"state": "run", "action": process_action}])
+
+		print(">> Preparing processing...")
+
+		def make_tasks():
 			for file_name in files_list:
-				target_folder = get_target_folder()
-				tasks.append((file_name, target_folder, is_unpacking_enabled, is_packing_enabled, packing_format))
-				
-			print(">> Processing files...")
-			i = 0
-			if is_log_enabled:
-				with Pool(processes=os.cpu_count()) as pool:
-					for task in pool.imap_unordered(process_file, tasks):
-						i += 1
-						f_name, result_log = task
-						print(f"({i}/{len(tasks)}) Processed: {Fore.GREEN}{f_name}{Style.RESET_ALL}")
-						if result_log is not None:
-							print(result_log)
+				if is_done(file_name) or (resumed is not None and resumed.states.get(file_name) == journal.DONE):
+					continue
+				target_folder = os.path.normpath(os.path.join(root.path, get_target_folder(file_name)))
+				folders.ensure(target_folder)
+				path = os.path.join(root.path, file_name)
+				owners[path] = (root, file_name)
+				root.tasks += 1
+				yield (path, target_folder, is_unpacking_enabled, is_packing_enabled, is_repacking_enabled,
+					   packing_format, root.path)
+
+		# Pool consumes tasks in its own thread, so workers start as soon as the first files are found
+		if is_root_streaming:
+			return make_tasks()
+		with run_metrics.phase("folders") as phase:
+			tasks = list(make_tasks())
+			phase.add(len(tasks))
+		return tasks
+
+	if len(roots) > 1:
+		print(f"Input folders: {Fore.GREEN}{len(roots)}{Style.RESET_ALL}")
+	roots_tasks = [prepare_root(root) for root in roots]
+
+	# Only show the duplicates removal plan
+	if is_dry_run:
+		plan = duplicates.RemovalPlan()
+		for root in roots:
+			if root.plan is not None:
+				plan.entries.extend(e._replace(path=os.path.join(root.path, e.path)) if len(roots) > 1 else e
+									for e in root.plan.entries)
+		if dry_run_file is not None:
+			plan.export(dry_run_file)
+			print(f"Duplicates removal plan saved to: {Fore.BLUE}{dry_run_file}{Style.RESET_ALL}")
+		else:
+			plan.print()
+		report_metrics()
+		print(">> DONE! Dry run, nothing was changed.")
+		sys.exit()
+
+	# Multithreaded processing for packing/unpacking, one pool and one scheduler for all roots,
+	# so the tail of one library is overlapped by the next one
+	if is_pool_run:
+		if all(isinstance(root_tasks, list) for root_tasks in roots_tasks):
+			tasks = [task for root_tasks in roots_tasks for task in root_tasks]
+		else:
+			tasks = (task for root_tasks in roots_tasks for task in root_tasks)
+		total = len(tasks) if isinstance(tasks, list) else None
+
+		def size_of(path) -> int:
+			root, f = owners[path]
+			entry = root.file_entries.get(f)
+			return entry.size if entry is not None else 0
+
+		def journaled(batches):
+			for batch in batches:
+				planned = {}
+				for task in ([t for _, game_tasks in batch for t in game_tasks] if is_solid_by_game else batch):
+					root, f = owners[task[0]]
+					planned.setdefault(root, []).append({"state": journal.PLANNED, "path": f, "size": size_of(task[0])})
+				for root, records in planned.items():
+					root.journal.write(records)
+				yield batch
+			for root in roots:
+				root.journal.write([{"state": "plan_complete"}])
+
+		if is_solid_by_game:
+			solid_groups, group_sizes = make_solid_groups(tasks, size_of)
+			batches = journaled(scheduler.make_batches(solid_groups, group_sizes.get, jobs))
+		else:
+			batches = journaled(scheduler.make_batches(tasks, size_of, jobs))
+		worker_function = process_solid_batch if is_solid_by_game else process_batch
+		pool_executor = executor
+		if pool_executor == "auto":
+			is_7z_involved = is_repacking_enabled or (is_packing_enabled and packing_format == "7z") or \
+				(is_unpacking_enabled and (total is None or any(t[0].lower().endswith(".7z") for t in tasks)))
+			pool_executor = scheduler.choose_executor(is_7z_involved,
+													  sum(size_of(t[0]) for t in tasks) if total is not None else None)
+		run_metrics.executor = pool_executor
+		io_slots = scheduler.make_io_slots(pool_executor, io_jobs)
+		# Thread workers share the journals of the main process
+		journal.attach(True)
+
+		def update_index(library_index, f_name, action, result_path):
+			if library_index is None:
+				return
+			if action is None:
+				library_index.move(f_name, f_name, process_action)
+			elif action == "extract":
+				library_index.forget(f_name)
 			else:
-				with Pool(processes=os.cpu_count()) as pool:
-					with tqdm(total=len(tasks), desc="Processing") as progress:
-						for _ in pool.imap_unordered(process_file, tasks):
-							progress.update(1)
-					
-	
-		remove_meta_files(".", is_log_enabled)
-		remove_empty_subfolders(".", is_log_enabled)
+				library_index.move(f_name, os.path.normpath(result_path), process_action)
+
+		processed = 0
+
+		def record_results(worker, results, progress=None):
+			nonlocal processed
+			for path, action, result_path, seconds in results:
+				root, f_name = owners.pop(path)
+				if result_path is not None:
+					result_path = os.path.relpath(result_path, root.path)
+					if result_path == ".":
+						result_path = ""
+				processed += 1
+				root.processed += 1
+				size = root.file_entries[f_name].size if f_name in root.file_entries else 0
+				run_metrics.record_file(worker, f_name, seconds, size)
+				phase.add(1, size)
+				update_index(root.library_index, f_name, action, result_path)
+				if action is not None:
+					root.touched_folders.add(os.path.dirname(f_name))
+				if len(roots) > 1:
+					events.emit("process", index=processed, total=total or sum(r.tasks for r in roots), path=f_name,
+								action=action, output=result_path, seconds=round(seconds, 6), worker=worker,
+								root=root.path)
+					if progress is not None:
+						progress.set_postfix_str(f"{os.path.basename(root.path)}: {root.processed}/{root.tasks}")
+				else:
+					events.emit("process", index=processed, total=total or root.tasks, path=f_name, action=action,
+								output=result_path, seconds=round(seconds, 6), worker=worker)
+
+		print(">> Processing files...")
+		try:
+			with run_metrics.phase("process") as phase, \
+					scheduler.make_pool(pool_executor, jobs, init_worker, (io_slots, pool_executor == "process")) as pool:
+				if is_log_enabled:
+					for worker, results in pool.imap_unordered(worker_function, batches):
+						record_results(worker, results)
+				else:
+					with tqdm(total=total, desc="Processing") as progress:
+						for worker, results in pool.imap_unordered(worker_function, batches):
+							record_results(worker, results, progress)
+							progress.update(len(results))
+		finally:
+			journal.detach()
+			for root in roots:
+				root.journal.close()
+		# The run is complete, nothing to resume
+		for root in roots:
+			journal.remove(os.path.join(root.path, journal.file_name))
+
+	for root in roots:
+		os.chdir(root.path)
+		if is_sort_enabled or is_pool_run:
+			with run_metrics.phase("remove-meta-files"):
+				remove_meta_files(root.meta_files)
+				root.touched_folders.update(os.path.dirname(f) for f in root.meta_files)
+			with run_metrics.phase("remove-empty-folders"):
+				remove_empty_folders(root.touched_folders.union(root.empty_folders))
+
+	# Files routed by every user-defined folder rule, to spot the ones that never match
+	if is_sort_enabled and not is_reverse_sort and folder_rules is not None:
+		print(">> Folders rules:")
+		for rule in folder_rules.rules:
+			print(f" | {rule.folder} ({', '.join(rule.tags)}): {Fore.BLUE}{rule.hits}{Style.RESET_ALL} files")
+
+	# Summary of every root and the total, when there are many
+	if len(roots) > 1:
+		def summary(name, files, removed, moved, processed) -> str:
+			return (f"{name}: {files} files"
+					+ (f", duplicates removed: {Fore.RED}{removed}{Style.RESET_ALL}" if removed else "")
+					+ (f", moved: {Fore.BLUE}{moved}{Style.RESET_ALL}" if moved else "")
+					+ (f", processed: {Fore.GREEN}{processed}{Style.RESET_ALL}" if processed else ""))
+
+		print(">> Summary:")
+		for root in roots:
+			print(" | " + summary(root.path, root.files, root.removed, root.moved, root.processed))
+		print(" | " + summary("Total", sum(r.files for r in roots), sum(r.removed for r in roots),
+							  sum(r.moved for r in roots), sum(r.processed for r in roots)))
+	library_index = roots[0].library_index
+
+	# Keep watching the library, applying the same operations only to the new files and their groups
+	if is_watch_enabled:
+		import watcher
+		if remove_duplicates_action == duplicates.Action.ASK:
+			print(f"{Fore.YELLOW}Warning: --watch can't ask which ROM to keep, all best ROMs are kept.{Style.RESET_ALL}")
+			remove_duplicates_action = duplicates.Action.KEEP_ALL
+		is_pool_needed = is_unpacking_enabled or is_packing_enabled or is_repacking_enabled
+		is_sort_needed = is_sort_enabled or is_pool_needed
+		own_files = {os.path.relpath(f) for f in (log_file, metrics_file, profile_file) if f is not None}
+		# Files created by romlm itself, their events are skipped once
+		own_outputs = set()
+		groups = {}
+		watch_decisions = duplicates.DecisionCache(".") if is_remove_duplicates else None
+
+		def group_of(f) -> str:
+			return tags.parse(os.path.basename(f)).group
+
+		def remember(f):
+			groups.setdefault(group_of(f), set()).add(f)
+
+		def forget(f):
+			paths = groups.get(group_of(f))
+			if paths is not None:
+				paths.discard(f)
+				if not paths:
+					del groups[group_of(f)]
+			if library_index is not None:
+				library_index.forget(f)
+
+		def forget_folder(folder):
+			prefix = folder + os.sep
+			for f in [f for paths in groups.values() for f in paths if f.startswith(prefix)]:
+				forget(f)
+
+		def process_changes(changes, pool):
+			watch_phase = run_metrics.get("watch")
+			for f in changes.removed:
+				forget(f)
+				forget_folder(f)
+			if changes.is_overflow:
+				# Too many events at once, compare with the library instead
+				print(f"{Fore.YELLOW}Warning: Too many changes at once, rescanning the library...{Style.RESET_ALL}")
+				known = {f for paths in groups.values() for f in paths}
+				changes.changed.update(e.path for e in scanner.scan(".") if e.path not in known)
+
+			new_files = []
+			for f in sorted(changes.changed):
+				if f in own_outputs:
+					own_outputs.discard(f)
+					continue
+				name = os.path.basename(f)
+				if name.lower() in scanner.meta_files:
+					if os.path.isfile(f):
+						os.remove(f)
+						events.emit("meta_removed", path=f)
+					continue
+				if f in own_files or not scanner.is_rom_file_name(name) or not os.path.isfile(f):
+					continue
+				remember(f)
+				new_files.append(f)
+			if not new_files:
+				return
+			sources = {os.path.dirname(f) for f in new_files}
+			removed = []
+
+			# Dedupe the new files only against the other ROMs of their games
+			if is_remove_duplicates:
+				candidates = sorted({p for f in new_files for p in groups.get(group_of(f), ())})
+				plan = duplicates.plan_duplicates(candidates, remove_duplicates_action, True, is_debug_log,
+												  is_summary=False, decisions=watch_decisions)
+				duplicates.execute_plan(plan)
+				# Only a few games are seen at once, the others are kept
+				watch_decisions.save(is_pruning=False)
+				removed = plan.removed
+				for f in removed:
+					forget(f)
+					sources.add(os.path.dirname(f))
+				new_files = [f for f in new_files if f not in set(removed)]
+
+			folders = moves.FolderCache()
+			processed = []
+			if is_sort_needed and not is_pool_needed:
+				for f in new_files:
+					target_folder = get_target_folder(f)
+					folders.ensure(target_folder)
+					new_path = os.path.normpath(moves.move_file(f, target_folder, folders))
+					if new_path != f:
+						own_outputs.add(new_path)
+						forget(f)
+						remember(new_path)
+						events.emit("move", path=f, target=new_path)
+					if library_index is not None:
+						library_index.move(f, new_path, process_action)
+					processed.append(f)
+			elif is_pool_needed:
+				tasks = []
+				for f in new_files:
+					target_folder = get_target_folder(f)
+					folders.ensure(target_folder)
+					tasks.append((f, target_folder, is_unpacking_enabled, is_packing_enabled, is_repacking_enabled,
+								  packing_format, "."))
+				sizes = {f: os.path.getsize(f) for f in new_files}
+				if is_solid_by_game:
+					solid_groups, group_sizes = make_solid_groups(tasks, sizes.get)
+					workers_results = pool.imap_unordered(process_solid_batch,
+														  scheduler.make_batches(solid_groups, group_sizes.get, jobs))
+				else:
+					workers_results = pool.imap_unordered(process_batch, scheduler.make_batches(tasks, sizes.get, jobs))
+				for worker, results in workers_results:
+					for f_name, action, result_path, seconds in results:
+						run_metrics.record_file(worker, f_name, seconds, sizes[f_name])
+						if action is not None:
+							forget(f_name)
+						if action in ("pack", "repack"):
+							result_path = os.path.normpath(result_path)
+							own_outputs.add(result_path)
+							remember(result_path)
+						if library_index is not None and action != "extract":
+							library_index.move(f_name, result_path if action is not None else f_name, process_action)
+						processed.append(f_name)
+						events.emit("process", index=len(processed), total=len(tasks), path=f_name, action=action,
+									output=result_path, seconds=round(seconds, 6), worker=worker)
+
+			for folder in sources:
+				remove_empty_parents(folder)
+			watch_phase.add(len(new_files) + len(removed))
+			print(f"[{time.strftime('%H:%M:%S')}] New files: {Fore.GREEN}{len(new_files) + len(removed)}{Style.RESET_ALL}"
+				  + (f", duplicates removed: {Fore.RED}{len(removed)}{Style.RESET_ALL}" if removed else "")
+				  + (f", processed: {Fore.BLUE}{len(processed)}{Style.RESET_ALL}" if processed else ""))
+
+		# Start watching before the library is listed, so nothing is missed in between
+		file_watcher = watcher.make_watcher(".")
+		for entry in scanner.scan("."):
+			remember(entry.path)
+		print(f">> Watching for new files ({file_watcher.name}), press Ctrl+C to stop...")
+		pool = None
+		if is_pool_needed:
+			# New files come a few at a time, the formats decide
+			watch_executor = executor
+			if watch_executor == "auto":
+				watch_executor = scheduler.choose_executor(is_repacking_enabled or is_unpacking_enabled or packing_format == "7z")
+			pool = scheduler.make_pool(watch_executor, jobs, scheduler.init_worker,
+									   (scheduler.make_io_slots(watch_executor, io_jobs), True))
+		try:
+			for changes in watcher.watch(file_watcher):
+				with run_metrics.phase("watch"):
+					process_changes(changes, pool)
+		except KeyboardInterrupt:
+			print(">> Stopped watching.")
+		finally:
+			file_watcher.close()
+			if pool is not None:
+				pool.terminate()
+				pool.join()
+
+	for root in roots:
+		if root.library_index is not None:
+			with run_metrics.phase("index"):
+				root.library_index.save()
 
+	report_metrics()
 	print(">> DONE!")
 	sys.exit()
 
 if __name__ == "__main__":
+	from multiprocessing import freeze_support
 	freeze_support()
 	mane()
@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import hashlib
+from typing import Optional
+
+# Defaults of the duplicates scoring rules, a scoring file (see load()) can change any of them
+default_rules = {
+    # A release for the whole world is as good as one for all prioritized regions
+    "top_region": "world",
+    # Prioritized regions, the best first
+    "regions": ["usa", "europe"],
+    # Releases for these regions get a penalty, unless they have one of the preferred languages
+    "asian_regions": ["japan", "asia", "china", "korea"],
+    "preferred_languages": ["en"],
+    # Languages that are not counted as extra tags
+    "languages": ["en", "fr", "de", "es", "it", "nl", "pt", "sv", "no", "da", "fi"],
+}
+
+# Categories of the tags that are not counted as extra ones
+TOP_REGION = 1
+REGION = 2
+ASIAN_REGION = 3
+LANGUAGE = 4
+# Revisions, versions and in-development tags, found by the combined pattern
+KNOWN = 5
+EXTRA = 0
+
+known_tag_pattern = re.compile(r"rev |\d+(?:\.\d+){0,3}$|beta|alpha|proto|sample")
+
+class TagRules:
+    """
+    Tag rules of the duplicates scoring, compiled once: every tag is looked up in one table of categories,
+    built from the lists of the rules and the combined pattern of the other known tags, and the scoring features
+    of every distinct set of tags are computed only once, as most ROMs share a few of them.
+    """
+
+    def __init__(self, **options):
+        unknown = set(options) - set(default_rules)
+        if unknown:
+            raise ValueError(f"Unknown scoring rules: {', '.join(sorted(unknown))}")
+        config = dict(default_rules, **options)
+        for key, value in config.items():
+            if key == "top_region":
+                if not isinstance(value, str):
+                    raise ValueError(f"'{key}' must be a string")
+            elif not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ValueError(f"'{key}' must be a list of strings")
+        self.config = config
+        self.top_region = config["top_region"].lower()
+        self.regions = tuple(r.lower() for r in config["regions"])
+        self.region_index = {}
+        for i, r in enumerate(self.regions):
+            self.region_index.setdefault(r, i)
+        self.asian_regions = frozenset(r.lower() for r in config["asian_regions"])
+        self.preferred_languages = frozenset(t.lower() for t in config["preferred_languages"])
+        # The lowest category wins when a tag is in many lists, as the checks of the scoring go in that order
+        self.categories = {}
+        for category, category_tags in ((LANGUAGE, config["languages"]), (ASIAN_REGION, self.asian_regions),
+                                        (REGION, self.regions), (TOP_REGION, [self.top_region])):
+            self.categories.update((t.lower(), category) for t in category_tags)
+        self.signature = json.dumps(config, sort_keys=True)
+        self.digest = hashlib.sha1(self.signature.encode("utf-8")).hexdigest()[:8]
+        self.features = {}
+
+    def __getstate__(self) -> dict:
+        # Process pool workers get the rules only, the features are cheap to compute again
+        return {"config": self.config}
+
+    def __setstate__(self, state):
+        self.__init__(**state["config"])
+
+    def get_category(self, tag) -> int:
+        category = self.categories.get(tag)
+        if category is None:
+            category = self.categories[tag] = KNOWN if known_tag_pattern.match(tag) else EXTRA
+        return category
+
+    def get_features(self, tags_list) -> tuple[int, int, int, bool, int]:
+        """
+        Scoring features of a tuple of tags:
+        (region coverage, min region index, number of extra tags, is Asian and not in a preferred language, video).
+        """
+        features = self.features.get(tags_list)
+        if features is None:
+            features = self.features[tags_list] = self._compute_features(tags_list)
+        return features
+
+    def _compute_features(self, tags_list) -> tuple[int, int, int, bool, int]:
+        categories = [self.get_category(t) for t in tags_list]
+        if TOP_REGION in categories:
+            coverage, min_index = len(self.regions), 0
+        else:
+            indexes = [self.region_index[t] for t, c in zip(tags_list, categories) if c == REGION]
+            coverage = len(indexes)
+            min_index = min(indexes) if indexes else len(self.regions)
+        extra = categories.count(EXTRA)
+        is_asian = (any(t in self.asian_regions for t in tags_list)
+                    and not any(t in self.preferred_languages for t in tags_list))
+        video = 2 if "ntsc" in tags_list else 0 if "pal" in tags_list else 1
+        return coverage, min_index, extra, is_asian, video
+
+def load(path) -> TagRules:
+    """Loads rules from a JSON file, with any keys of the 'default_rules'. Raises ValueError if it's invalid."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            options = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Can't read the scoring rules from '{path}': {e}")
+    if not isinstance(options, dict):
+        raise ValueError(f"Scoring rules in '{path}' must be a JSON object")
+    return TagRules(**options)
+
+# Rules of the current run
+active = TagRules()
+
+def use(rules):
+    global active
+    active = rules
+
+class FolderRule:
+    """Folder of the sorting for files with any of the 'tags', unless they have any of the 'excludes'."""
+    __slots__ = ("folder", "tags", "excludes", "priority", "order", "hits")
+
+    def __init__(self, folder, tags, excludes=(), priority=0, order=0):
+        self.folder = folder
+        self.tags = tuple(t.lower() for t in tags)
+        self.excludes = frozenset(t.lower() for t in excludes)
+        self.priority = priority
+        self.order = order
+        # Number of files routed by the rule in this run
+        self.hits = 0
+
+    @property
+    def rank(self) -> tuple[int, int]:
+        # The highest priority wins, then the rule that comes first
+        return -self.priority, self.order
+
+class FolderRules:
+    """
+    Tags to folders rules of the sorting, compiled into one index of tags, so a file is routed by looking up
+    only its own tags, however many rules there are. Files with any of the 'excludes' are never routed.
+    """
+
+    def __init__(self, rules, excludes=()):
+        self.rules = list(rules)
+        self.excludes = frozenset(t.lower() for t in excludes)
+        self.index = {}
+        for rule in sorted(self.rules, key=lambda r: r.rank):
+            for tag in rule.tags:
+                self.index.setdefault(tag, []).append(rule)
+        self.signature = json.dumps([[r.folder, r.tags, sorted(r.excludes), r.priority] for r in self.rules]
+                                    + [sorted(self.excludes)])
+        self.digest = hashlib.sha1(self.signature.encode("utf-8")).hexdigest()[:8]
+
+    @classmethod
+    def from_folders(cls, subfolders, exclude_tags=None) -> "FolderRules":
+        """Rules of the '-f' and '-e' options, the first matching subfolder wins."""
+        return cls([]).extended(subfolders, exclude_tags)
+
+    def extended(self, subfolders=None, exclude_tags=None) -> "FolderRules":
+        """The same rules, followed by the ones of the '-f' subfolders, with the '-e' tags excluded as well."""
+        extra = [FolderRule("!" + subfolder, [subfolder], order=len(self.rules) + i)
+                 for i, subfolder in enumerate(subfolders or ())]
+        return FolderRules(self.rules + extra, self.excludes.union(t.lower() for t in exclude_tags or ()))
+
+    def route(self, file_tags) -> Optional[FolderRule]:
+        """The best rule for a tuple of lowercased tags, or None if no rule matches. Counts a hit of the rule."""
+        if not self.excludes.isdisjoint(file_tags):
+            return None
+        best = None
+        for tag in file_tags:
+            # Rules of every tag are sorted by their rank, only the first one not excluded matters
+            for rule in self.index.get(tag, ()):
+                if best is not None and rule.rank >= best.rank:
+                    break
+                if rule.excludes.isdisjoint(file_tags):
+                    best = rule
+                    break
+        if best is not None:
+            best.hits += 1
+        return best
+
+    def report(self) -> list[dict]:
+        return [{"folder": r.folder, "tags": list(r.tags), "priority": r.priority, "hits": r.hits} for r in self.rules]
+
+def load_folders(path) -> FolderRules:
+    """
+    Loads folders rules from a JSON file: {"exclude": [tags], "rules": [{"folder", "tags", "exclude", "priority"}]},
+    only "folder" and "tags" of a rule are required. Raises ValueError if it's invalid.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            options = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Can't read the folders rules from '{path}': {e}")
+    if not isinstance(options, dict) or not isinstance(options.get("rules"), list):
+        raise ValueError(f"Folders rules in '{path}' must be a JSON object with a list of 'rules'")
+    unknown = set(options) - {"exclude", "rules"}
+    if unknown:
+        raise ValueError(f"Unknown folders options in '{path}': {', '.join(sorted(unknown))}")
+
+    def get_tags(owner, key, is_required=False) -> list[str]:
+        value = owner.get(key, None if is_required else [])
+        if not isinstance(value, list) or not all(isinstance(v, str) and v for v in value) or (is_required and not value):
+            raise ValueError(f"'{key}' in '{path}' must be a {'non-empty ' if is_required else ''}list of tags")
+        return value
+
+    folder_rules = []
+    for i, rule in enumerate(options["rules"]):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule #{i + 1} in '{path}' must be a JSON object")
+        unknown = set(rule) - {"folder", "tags", "exclude", "priority"}
+        if unknown:
+            raise ValueError(f"Unknown options of rule #{i + 1} in '{path}': {', '.join(sorted(unknown))}")
+        folder = rule.get("folder")
+        if (not isinstance(folder, str) or not folder.strip("./\\") or os.path.isabs(folder)
+                or ".." in folder.replace("\\", "/").split("/")):
+            raise ValueError(f"'folder' of rule #{i + 1} in '{path}' must be a folder name inside the library")
+        priority = rule.get("priority", 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError(f"'priority' of rule #{i + 1} in '{path}' must be an integer")
+        folder_rules.append(FolderRule(folder, get_tags(rule, "tags", True), get_tags(rule, "exclude"), priority, i))
+    return FolderRules(folder_rules, get_tags(options, "exclude"))
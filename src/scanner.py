@@ -0,0 +1,73 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+meta_files = frozenset(["desktop.ini", "thumbs.db", ".ds_store"])
+
+class FileEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: int
+
+def is_rom_file_name(name) -> bool:
+    # The same rule as the '**/*.*' glob: not hidden and has an extension, but skip system meta files
+    return not name.startswith(".") and "." in name and name.lower() not in meta_files
+
+def scan(root=".", workers=None, meta_files_found=None, empty_folders_found=None):
+    """
+    Walks the folders tree with a pool of threads and yields FileEntry for every ROM file
+    as soon as its folder is listed, so the caller can start working before the walk is finished.
+    Paths are relative to the 'root', hidden folders are skipped.
+    System meta files and empty folders met on the way are appended to the optional lists, if given,
+    so they can be cleaned up without walking the tree again.
+    """
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4)
+    results = queue.Queue()
+    stopped = threading.Event()
+
+    def walk(rel_dir):
+        files = []
+        subdirs = []
+        try:
+            if not stopped.is_set():
+                is_empty = True
+                with os.scandir(os.path.join(root, rel_dir)) as it:
+                    for entry in it:
+                        is_empty = False
+                        try:
+                            if meta_files_found is not None and entry.name.lower() in meta_files:
+                                meta_files_found.append(os.path.join(rel_dir, entry.name))
+                                continue
+                            if entry.name.startswith("."):
+                                continue
+                            if entry.is_dir():
+                                subdirs.append(os.path.join(rel_dir, entry.name))
+                            elif is_rom_file_name(entry.name):
+                                stat = entry.stat()
+                                files.append(FileEntry(os.path.join(rel_dir, entry.name), stat.st_size, stat.st_mtime_ns))
+                        except OSError:
+                            continue
+                if is_empty and rel_dir and empty_folders_found is not None:
+                    empty_folders_found.append(rel_dir)
+        except OSError:
+            pass
+        # Report the folder before its subfolders are queued, so the consumer never misses pending work
+        results.put((files, 0 if stopped.is_set() else len(subdirs)))
+        if not stopped.is_set():
+            for subdir in subdirs:
+                executor.submit(walk, subdir)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="romlm-scan")
+    try:
+        executor.submit(walk, "")
+        pending = 1
+        while pending:
+            files, subdirs = results.get()
+            pending += subdirs - 1
+            yield from files
+    finally:
+        stopped.set()
+        executor.shutdown(wait=True)
@@ -0,0 +1,92 @@
+import os
+import signal
+import threading
+from contextlib import nullcontext
+
+# Files from that size are disk-heavy, they are scheduled alone and as early as possible
+large_file_size = 64 * 1024 * 1024
+# Small files are batched together until a batch reaches any of these limits
+batch_bytes_limit = 32 * 1024 * 1024
+batch_files_limit = 64
+
+executors = ("process", "thread", "auto")
+# Below that much data a process pool costs more to start (forking, imports in every worker, pickling)
+# than it saves, the work itself takes less than that on any format
+thread_workload_bytes = 64 * 1024 * 1024
+
+# Worker-side semaphore limiting how many disk-heavy files are processed at the same time
+io_slots = None
+
+def init_worker(slots, is_ignoring_interrupts=False):
+    global io_slots
+    io_slots = slots
+    # Long-living pools leave Ctrl+C to the main process, which stops them cleanly.
+    # Threads never get signals, and can't set their handlers
+    if is_ignoring_interrupts and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def choose_executor(is_7z_involved, total_bytes=None) -> str:
+    """
+    Executor for the 'auto' mode, 'thread' or 'process'. zlib releases the GIL while it compresses, so zip work
+    scales on threads without paying for the worker processes, while py7zr spends much of its time in Python code.
+    Small workloads go to threads on any format. 'total_bytes' is None when the tasks are streamed.
+    """
+    if total_bytes is not None and total_bytes < thread_workload_bytes:
+        return "thread"
+    return "process" if is_7z_involved else "thread"
+
+def make_pool(executor, jobs, initializer, initargs):
+    """A multiprocessing pool of the executor, threads share the state of the main process, like folders caches."""
+    if executor == "thread":
+        from multiprocessing.pool import ThreadPool
+        return ThreadPool(processes=jobs, initializer=initializer, initargs=initargs)
+    from multiprocessing import Pool
+    return Pool(processes=jobs, initializer=initializer, initargs=initargs)
+
+def make_io_slots(executor, io_jobs):
+    if io_jobs is None:
+        return None
+    if executor == "thread":
+        return threading.Semaphore(io_jobs)
+    from multiprocessing import Semaphore
+    return Semaphore(io_jobs)
+
+def get_size(file_name) -> int:
+    try:
+        return os.path.getsize(file_name)
+    except OSError:
+        return 0
+
+def io_slot(is_large):
+    """Context to hold while processing files. Waits for a free I/O slot if they are disk-heavy, 'is_large' ones."""
+    return io_slots if is_large and io_slots is not None else nullcontext()
+
+def make_batches(tasks, size_of, jobs):
+    """
+    Splits tasks (their first item is a file path) into batches for the workers pool.
+    Large files go alone and, when the full list is known, the largest first, so the longest jobs never
+    start last and leave other workers idle. Small files are batched to not pay the IPC for every tiny one.
+    For a streamed tasks, large files go out as soon as they are found.
+    """
+    if isinstance(tasks, list):
+        tasks = sorted(tasks, key=lambda t: size_of(t[0]), reverse=True)
+        # Keep enough batches to balance the load between workers
+        files_limit = max(1, min(batch_files_limit, len(tasks) // (jobs * 4)))
+    else:
+        files_limit = batch_files_limit
+
+    batch = []
+    batch_bytes = 0
+    for task in tasks:
+        size = size_of(task[0])
+        if size >= large_file_size:
+            yield [task]
+            continue
+        batch.append(task)
+        batch_bytes += size
+        if batch_bytes >= batch_bytes_limit or len(batch) >= files_limit:
+            yield batch
+            batch = []
+            batch_bytes = 0
+    if batch:
+        yield batch
@@ -1,5 +1,23 @@
 import os
 import re
+from functools import lru_cache
+from typing import Optional
+
+tag_groups_pattern = re.compile(r'[(\[](.*?)[)\]]')
+disc_pattern = re.compile(r"(disc|disk|track)\s*(\d+)")
+date_pattern = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+revision_pattern = re.compile(r"^(rev|proto|alpha|beta|sample|demo)\s+([a-z])$")
+version_pattern = re.compile(r"^(?:(rev|beta|alpha|proto|sample|demo)\s+)?v?(\d+(?:\.\d+){0,3})?$")
+
+beta_prefixes = ("beta", "alpha", "proto", "sample", "demo")
+
+# All region names used by the no-intro naming convention (lowercased)
+known_regions = frozenset([
+    "world", "usa", "europe", "japan", "asia", "australia", "brazil", "canada", "china", "france",
+    "germany", "hong kong", "india", "ireland", "italy", "korea", "latin america", "mexico",
+    "netherlands", "new zealand", "norway", "poland", "portugal", "russia", "scandinavia",
+    "south africa", "spain", "sweden", "taiwan", "uk", "denmark", "finland", "greece", "unknown",
+])
 
 def is_homebrew(file_tags) -> bool:
     return "homebrew" in file_tags or "aftermarket" in file_tags
@@ -7,17 +25,13 @@ def is_homebrew(file_tags) -> bool:
 def is_pirate(file_tags) -> bool:
     return "pirate" in file_tags or "unl" in file_tags
 
-def get_from_filename(filename: str) -> list[str]:
-    name_no_ext = os.path.splitext(filename)[0]
-    groups = re.findall(r'[(\[](.*?)[)\]]', name_no_ext)
+def split_tags(name_no_ext: str) -> list[str]:
     all_tags = []
-    for g in groups:
-        split_tags = [t.strip() for t in g.split(',')]
-        all_tags.extend(split_tags)
-    return [tag.lower() for tag in all_tags]
+    for g in tag_groups_pattern.findall(name_no_ext):
+        all_tags.extend(t.strip().lower() for t in g.split(','))
+    return all_tags
 
-def get_base_name(filename: str) -> str:
-    name_no_ext = os.path.splitext(filename)[0]
+def split_base_name(name_no_ext: str) -> str:
     idx_1 = name_no_ext.find('(')
     idx_2 = name_no_ext.find('[')
     idx = min(idx_1, idx_2) if idx_1 != -1 and idx_2 != -1 else max(idx_1, idx_2)
@@ -25,4 +39,103 @@ def get_base_name(filename: str) -> str:
         base = name_no_ext[:idx].strip()
     else:
         base = name_no_ext.strip()
-    return base
\ No newline at end of file
+    return base
+
+@lru_cache(maxsize=None)
+def get_tag_values(tag) -> tuple[int, Optional[int], Optional[int]]:
+    """
+    (disc number or -1, version score or None, date score or None) of a single tag.
+    Memoized, as the same few tags are found in the most of the filenames, so every tag is matched only once.
+    """
+    m = disc_pattern.match(tag)
+    disc = int(m.group(2)) if m else -1
+    # Catch numeric revisions
+    m = revision_pattern.match(tag)
+    if m:
+        rev = m.group(2)[0]
+        version = ord(rev) - ord('a') + 1
+    else:
+        # Catch version numbers
+        m = version_pattern.match(tag)
+        # Empty tags, like in "()", match the pattern without any version
+        if m and m.group(2) is not None:
+            version_str = m.group(2)
+            parts = version_str.split(".")
+            version_tuple = tuple(map(int, parts)) + (0,) * (4 - len(parts))
+            version = int("".join(f"{v:03}" for v in version_tuple))
+        else:
+            version = None
+    date = int(tag.replace("-", "")) if date_pattern.match(tag) else None
+    return disc, version, date
+
+# Is ROM a part of multi-disc set?
+def get_disc_number(tags_list) -> int:
+    """
+    Returns '-1' if the ROM is not a part of a multi-disc set, or disc number otherwise.
+    """
+    for t in tags_list:
+        disc = get_tag_values(t)[0]
+        if disc != -1:
+            return disc
+    return -1
+
+# Identify if ROM is Beta/Proto/Sample
+def is_beta(tags_list) -> bool:
+    # If any tag starts with "beta", "proto", "sample", etc., we treat it as Beta/Proto
+    return any(t.startswith(beta_prefixes) for t in tags_list)
+
+# Try to get version from tags list
+def try_get_version_score(tags_list) -> tuple[int, bool]:
+    for t in tags_list:
+        version = get_tag_values(t)[1]
+        if version is not None:
+            return version, True
+    return 0, False
+
+# Get the date score from tags list, like (1993-07-09)
+def get_date_score(tags_list) -> int:
+    for t in tags_list:
+        date = get_tag_values(t)[2]
+        if date is not None:
+            return date
+    return 0
+
+class RomName:
+    """
+    Everything romlm needs to know about a ROM, derived from its filename only once.
+    """
+    __slots__ = ("name", "base", "tags", "disc", "group", "is_beta", "regions", "version", "has_version", "date")
+
+    def __init__(self, filename: str):
+        name_no_ext = os.path.splitext(filename)[0]
+        self.name = filename
+        self.base = split_base_name(name_no_ext)
+        self.tags = tuple(split_tags(name_no_ext))
+        self.disc = get_disc_number(self.tags)
+        # Discs of the same game are different games for the duplicates removal
+        self.group = self.base + f" (Disc {self.disc})" if self.disc > -1 else self.base
+        self.is_beta = is_beta(self.tags)
+        self.regions = tuple(t for t in self.tags if t in known_regions)
+        self.version, self.has_version = try_get_version_score(self.tags)
+        self.date = get_date_score(self.tags)
+
+    @property
+    def is_game_archive(self) -> bool:
+        """Solid archive of a whole game, as packed by --solid-by-game, it's named after the game group itself."""
+        return self.name.endswith(".7z") and os.path.splitext(self.name)[0] == self.group
+
+    def __repr__(self):
+        return f"RomName({self.name!r})"
+
+@lru_cache(maxsize=None)
+def parse(filename: str) -> RomName:
+    """
+    Memoized RomName parser. 'filename' should be a base name, without folders.
+    """
+    return RomName(filename)
+
+def get_from_filename(filename: str) -> list[str]:
+    return list(parse(filename).tags)
+
+def get_base_name(filename: str) -> str:
+    return parse(filename).base
@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import NamedTuple
+
+import scanner
+
+# Changes are collected until there are no new ones for that long, but not longer than the max delay
+debounce_delay = 0.2
+max_batch_delay = 1.0
+# How often the library is rescanned, when inotify is not available
+poll_interval = 1.0
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+inotify_event = struct.Struct("iIII")
+
+class Changes(NamedTuple):
+    """Files (and removed folders) changed since the last batch, paths are relative to the watched root."""
+    changed: set
+    removed: set
+    is_overflow: bool = False
+
+    def add(self, path, is_removed=False):
+        # The latest change of a path wins
+        (self.changed if is_removed else self.removed).discard(path)
+        (self.removed if is_removed else self.changed).add(path)
+
+    def merge(self, other) -> "Changes":
+        for path in other.changed:
+            self.add(path)
+        for path in other.removed:
+            self.add(path, True)
+        return self if not other.is_overflow else self._replace(is_overflow=True)
+
+class InotifyWatcher:
+    """
+    Watches the folders tree with Linux inotify, through ctypes. New folders are watched as soon as
+    they appear, and files that were already in them are reported as changed.
+    """
+
+    name = "inotify"
+
+    def __init__(self, root):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self.folders = {}
+        try:
+            self.add_tree("", is_strict=True)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add_folder(self, folder, is_strict=False):
+        path = os.path.join(self.root, folder) if folder else self.root
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), watch_mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # Out of watches, the polling fallback will do better than a half-watched library
+            if is_strict or error == errno.ENOSPC:
+                raise OSError(error, f"inotify_add_watch failed for '{path}'")
+            return
+        self.folders[wd] = folder
+
+    def add_tree(self, folder, is_strict=False) -> list[str]:
+        """Watches the folder with all its subfolders. Returns files that are already there."""
+        files = []
+        stack = [folder]
+        while stack:
+            folder = stack.pop()
+            # Watch first and list then, so no file slips in between
+            self.add_folder(folder, is_strict)
+            try:
+                with os.scandir(os.path.join(self.root, folder) if folder else self.root) as it:
+                    for entry in it:
+                        if entry.name.startswith("."):
+                            continue
+                        path = os.path.join(folder, entry.name)
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(path)
+                        else:
+                            files.append(path)
+            except OSError:
+                continue
+        return files
+
+    def remove_tree(self, folder):
+        prefix = folder + os.sep
+        for wd, watched in list(self.folders.items()):
+            if watched == folder or watched.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.folders[wd]
+
+    def poll(self, timeout) -> Changes:
+        """Waits up to 'timeout' seconds (forever if None) for changes. Returns None if there were none."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return None
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return None
+
+        changes = Changes(set(), set())
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = inotify_event.unpack_from(data, offset)
+            name = data[offset + inotify_event.size:offset + inotify_event.size + length].rstrip(b"\0")
+            offset += inotify_event.size + length
+            if mask & IN_Q_OVERFLOW:
+                changes = changes._replace(is_overflow=True)
+                continue
+            if mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+                continue
+            folder = self.folders.get(wd)
+            name = os.fsdecode(name)
+            if folder is None or not name or name.startswith("."):
+                continue
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    for file_path in self.add_tree(path):
+                        changes.add(file_path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.remove_tree(path)
+                    changes.add(path, True)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changes.add(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changes.add(path, True)
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Fallback for systems without inotify: rescans the library every 'poll_interval' seconds.
+    A file is reported only when its size and mtime didn't change between two scans, so it's fully written.
+    """
+
+    name = "polling"
+
+    def __init__(self, root, interval=None):
+        self.root = root
+        self.interval = interval or poll_interval
+        self.snapshot = self.scan()
+        self.reported = dict(self.snapshot)
+        self.next_scan = time.monotonic() + self.interval
+
+    def scan(self) -> dict:
+        return {entry.path: (entry.size, entry.mtime) for entry in scanner.scan(self.root)}
+
+    def poll(self, timeout) -> Changes:
+        wait = self.next_scan - time.monotonic()
+        if timeout is not None and timeout < wait:
+            time.sleep(timeout)
+            return None
+        if wait > 0:
+            time.sleep(wait)
+        self.next_scan = time.monotonic() + self.interval
+
+        current = self.scan()
+        changes = Changes(set(), set())
+        for path, stat in current.items():
+            if self.snapshot.get(path) == stat and self.reported.get(path) != stat:
+                self.reported[path] = stat
+                changes.add(path)
+        for path in [p for p in self.reported if p not in current]:
+            del self.reported[path]
+            changes.add(path, True)
+        self.snapshot = current
+        return changes if changes.changed or changes.removed else None
+
+    def close(self):
+        pass
+
+def make_watcher(root="."):
+    """Returns an inotify watcher on Linux, or a polling one, if inotify is not available."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root)
+
+def watch(watcher):
+    """
+    Yields Changes in debounced batches: a batch is closed when there are no new changes for 'debounce_delay',
+    or after 'max_batch_delay' at most, so a steady stream of files is still processed as it comes.
+    """
+    while True:
+        changes = watcher.poll(None)
+        if changes is None:
+            continue
+        start = time.monotonic()
+        while time.monotonic() - start < max_batch_delay:
+            more = watcher.poll(debounce_delay)
+            if more is None:
+                break
+            changes = changes.merge(more)
+        yield changes